@@ -1,8 +1,8 @@
-from app.utils import create_map, multigraph_to_cytoscape_json
+from app.utils import create_map, multigraph_to_cytoscape_json, ResponseCache
 from app.route_manager import RouteManager
 
 from fastapi import FastAPI, Request, Form, Query
-from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from datetime import timedelta
 from pathlib import Path
@@ -85,6 +85,9 @@ admin_pwd = {
 
 SESSIONS = {}
 
+# /user_path responses, keyed by (from, to, network version)
+USER_PATH_CACHE = ResponseCache(maxsize=4096, ttl=600)
+
 
 def get_user_from_cookie(request: Request):
     token = request.cookies.get("session")
@@ -172,9 +175,18 @@ def get_graph():
 def get_graph():
     return JSONResponse(content = len(rm.Routes))
 
+@app.get("/api/graph_version")
+def get_graph():
+    return JSONResponse(content = rm.network_version)
+
+@app.get("/api/user_path_cache")
+def get_user_path_cache_stats():
+    return JSONResponse(content = USER_PATH_CACHE.stats())
+
 @app.get("/ret_graph")
 def get_graph():
-    rm.Routes = [rm.Routes[0]]
+    rm.reset_routes()
+    USER_PATH_CACHE.clear()
     data = multigraph_to_cytoscape_json(rm.Routes[0])
     return JSONResponse(content = data)
 
@@ -185,6 +197,7 @@ def rm_road(
 ):
     try:
         if rm.remove_road(start, end):
+            USER_PATH_CACHE.clear()
             data = multigraph_to_cytoscape_json(rm.Routes[-1])
             return JSONResponse(content = data)
         else: raise
@@ -197,9 +210,13 @@ def user_path(
     start: str = Query(..., alias="from"),
     end: str = Query(..., alias="to")
 ):
-    try:
+    def render():
         subgraph = rm.shortest_route_path(start, end)
         subgraph['graph'] = multigraph_to_cytoscape_json(subgraph['graph'])
-        return JSONResponse(content=subgraph)
+        return JSONResponse(content=subgraph).body
+
+    try:
+        body = USER_PATH_CACHE.get_or_compute((start, end, rm.network_version), render)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=400)
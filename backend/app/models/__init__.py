@@ -1,3 +1,4 @@
-from .buckets import BucketQueue
+from .buckets import BucketQueue, GainBuckets
 from .routes import Route
-from .flow_models import FlowEdge
\ No newline at end of file
+from .flow_models import FlowEdge, ResidualGraph
+from .csr_graph import CSRGraph
\ No newline at end of file
@@ -1,3 +1,4 @@
+import math
 from collections import defaultdict
 
 # Efficient bucket queue for Fiduccia–Mattheyses algorithm gains.
@@ -54,4 +55,93 @@ class BucketQueue:
                 break
                 
     def is_empty(self):
-        return self.highest_non_empty == -1
\ No newline at end of file
+        return self.highest_non_empty == -1
+
+# Gain buckets for Fiduccia–Mattheyses refinement with O(1) insert/remove, same interface as
+# BucketQueue. A fixed array of buckets, each a doubly linked list of nodes (newest first),
+# and a pointer to the highest non-empty bucket that only moves down on remove/pop_max, so
+# finding the max is amortised O(1) over a pass.
+# Quantisation: gains are bucketed as floor(gain * bucket_size) (clamped to the array, so
+# |gain| above max_gain / 2 lands in the edge buckets). The exact float gain is kept per node
+# and pop_max returns it; within one bucket nodes come out newest first, not by exact gain.
+# The defaults match BucketQueue; for_bound sizes the array to the gains a graph can produce.
+class GainBuckets:
+    def __init__(self, max_gain=1000, bucket_size=100):
+        self.max_gain = max_gain
+        self.bucket_size = bucket_size
+        size = max(1, int(max_gain * bucket_size))
+        self.offset = size // 2
+        self.heads = [None] * size
+        self.top = -1  # highest bucket that may be non-empty
+        self._next = {}
+        self._prev = {}
+        self._bucket = {}
+        self._gain = {}
+
+    @classmethod
+    def for_bound(cls, bound, count):
+        # gains within [-bound, bound] (in FM: the largest weighted degree) spread over about
+        # 2 * count buckets, so the array and the max pointer's walks stay O(count)
+        bound = max(bound, 1e-9)
+        return cls(max_gain=2 * bound, bucket_size=max(1, count) / bound)
+
+    def _gain_to_bucket(self, gain):
+        bucket_id = math.floor(gain * self.bucket_size) + self.offset
+        return max(0, min(bucket_id, len(self.heads) - 1))
+
+    def insert(self, gain, node):
+        if node in self._bucket:
+            self._unlink(node)
+        bucket_id = self._gain_to_bucket(gain)
+        head = self.heads[bucket_id]
+        self._next[node] = head
+        self._prev[node] = None
+        if head is not None:
+            self._prev[head] = node
+        self.heads[bucket_id] = node
+        self._bucket[node] = bucket_id
+        self._gain[node] = gain
+        if bucket_id > self.top:
+            self.top = bucket_id
+
+    def _unlink(self, node):
+        bucket_id = self._bucket.pop(node)
+        prev, nxt = self._prev.pop(node), self._next.pop(node)
+        if prev is None:
+            self.heads[bucket_id] = nxt
+        else:
+            self._next[prev] = nxt
+        if nxt is not None:
+            self._prev[nxt] = prev
+        return self._gain.pop(node)
+
+    def remove(self, gain, node):
+        # gain is only there for BucketQueue compatibility, the node knows its bucket
+        if node in self._bucket:
+            self._unlink(node)
+
+    def _settle_top(self):
+        heads = self.heads
+        top = self.top
+        while top >= 0 and heads[top] is None:
+            top -= 1
+        self.top = top
+
+    def pop_max(self):
+        self._settle_top()
+        if self.top == -1:
+            return None
+        node = self.heads[self.top]
+        return self._unlink(node), node
+
+    def gain(self, node):
+        return self._gain.get(node)
+
+    def __contains__(self, node):
+        return node in self._bucket
+
+    def __len__(self):
+        return len(self._bucket)
+
+    def is_empty(self):
+        return not self._bucket
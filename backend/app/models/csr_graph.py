@@ -0,0 +1,162 @@
+import hashlib
+import numpy as np
+import networkx as nx
+
+# Compact graph core shared by the services: station names are interned to ints once,
+# adjacency is stored CSR-style (row i = arcs offsets[i]:offsets[i+1]) and removing
+# nodes/edges only flips boolean masks on a view that shares the arrays.
+class CSRGraph:
+    ATTRS = ("travel_time", "traffic", "weight")
+
+    def __init__(self, names, offsets, targets, travel_time, traffic, weight,
+                 directed=False, node_mask=None, edge_mask=None):
+        self.names = names
+        self.index = {n: i for i, n in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self.travel_time = travel_time
+        self.traffic = traffic
+        self.weight = weight
+        self.directed = directed
+        self.node_mask = np.ones(len(names), dtype=bool) if node_mask is None else node_mask
+        self.edge_mask = np.ones(len(targets), dtype=bool) if edge_mask is None else edge_mask
+        self._adjacency = {}
+        self._version = None
+
+    @classmethod
+    def from_networkx(cls, G):
+        names = list(G.nodes())
+        index = {n: i for i, n in enumerate(names)}
+        directed = G.is_directed()
+
+        src, dst = [], []
+        values = {attr: [] for attr in cls.ATTRS}
+        for u, v, data in G.edges(data=True):
+            pairs = [(index[u], index[v])] if directed else [(index[u], index[v]), (index[v], index[u])]
+            for a, b in pairs:
+                src.append(a)
+                dst.append(b)
+                for attr in cls.ATTRS:
+                    values[attr].append(float(data.get(attr, 0.0)))
+
+        src = np.array(src, dtype=np.int64)
+        dst = np.array(dst, dtype=np.int64)
+        # sort arcs by (source, target) so every row can be binary searched
+        order = np.lexsort((dst, src))
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(names)), out=offsets[1:])
+
+        return cls(
+            names, offsets, dst[order],
+            *(np.array(values[attr], dtype=np.float64)[order] for attr in cls.ATTRS),
+            directed=directed
+        )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_adjacency'] = {}  # derived, rebuilt on demand
+        return state
+
+    @property
+    def version(self):
+        # digest of the names, arrays and masks: caches key on it, so equal graphs (also after
+        # pickling) share entries and any change gives a new version
+        if self.__dict__.get('_version') is None:
+            h = hashlib.blake2b(digest_size=16)
+            h.update(repr(self.names).encode())
+            for a in (self.offsets, self.targets, self.travel_time, self.traffic, self.weight,
+                      self.node_mask, self.edge_mask):
+                h.update(np.ascontiguousarray(a).tobytes())
+            h.update(b"d" if self.directed else b"u")
+            self._version = h.hexdigest()
+        return self._version
+
+    def is_directed(self):
+        return self.directed
+
+    def number_of_nodes(self):
+        return int(self.node_mask.sum())
+
+    def nodes(self):
+        return [n for n, active in zip(self.names, self.node_mask.tolist()) if active]
+
+    def has_node(self, n):
+        i = self.index.get(n)
+        return i is not None and bool(self.node_mask[i])
+
+    def _arc(self, i, j):
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        pos = lo + np.searchsorted(self.targets[lo:hi], j)
+        return int(pos) if pos < hi and self.targets[pos] == j else -1
+
+    def arc(self, u, v):
+        # position of the active arc u -> v, or -1
+        i, j = self.index.get(u), self.index.get(v)
+        if i is None or j is None or not (self.node_mask[i] and self.node_mask[j]):
+            return -1
+        pos = self._arc(i, j)
+        return pos if pos >= 0 and self.edge_mask[pos] else -1
+
+    def has_edge(self, u, v):
+        return self.arc(u, v) >= 0
+
+    def edge_attr(self, u, v, attr="weight"):
+        pos = self.arc(u, v)
+        if pos < 0:
+            raise KeyError(f"No edge between {u} and {v}")
+        return float(getattr(self, attr)[pos])
+
+    def masked(self, remove_edges=(), remove_nodes=()):
+        # a view with some nodes / edges switched off; the CSR arrays are shared
+        node_mask = self.node_mask.copy()
+        edge_mask = self.edge_mask.copy()
+        for n in remove_nodes:
+            i = self.index.get(n)
+            if i is not None:
+                node_mask[i] = False
+        for u, v in remove_edges:
+            i, j = self.index.get(u), self.index.get(v)
+            if i is None or j is None:
+                continue
+            for a, b in ((i, j), (j, i)) if not self.directed else ((i, j),):
+                pos = self._arc(a, b)
+                if pos >= 0:
+                    edge_mask[pos] = False
+        return CSRGraph(self.names, self.offsets, self.targets, self.travel_time, self.traffic, self.weight,
+                        directed=self.directed, node_mask=node_mask, edge_mask=edge_mask)
+
+    def arcs(self):
+        # (source, target, position) arrays of the active arcs
+        src = np.repeat(np.arange(len(self.names), dtype=np.int64), np.diff(self.offsets))
+        keep = self.edge_mask & self.node_mask[src] & self.node_mask[self.targets]
+        pos = np.flatnonzero(keep)
+        return src[pos], self.targets[pos], pos
+
+    def adjacency(self, attr="weight"):
+        # {name: {neighbor: value}}, built once per view and attribute
+        if attr not in self._adjacency:
+            src, dst, pos = self.arcs()
+            values = getattr(self, attr)[pos].tolist()
+            names = self.names
+            adj = {n: {} for n in self.nodes()}
+            for a, b, value in zip(src.tolist(), dst.tolist(), values):
+                adj[names[a]][names[b]] = value
+            self._adjacency[attr] = adj
+        return self._adjacency[attr]
+
+    def to_scipy(self, attr="weight"):
+        from scipy.sparse import csr_matrix
+        src, dst, pos = self.arcs()
+        n = len(self.names)
+        return csr_matrix((getattr(self, attr)[pos], (src, dst)), shape=(n, n))
+
+    def to_networkx(self, attrs=ATTRS):
+        G = nx.DiGraph() if self.directed else nx.Graph()
+        G.add_nodes_from(self.nodes())
+        src, dst, pos = self.arcs()
+        columns = [getattr(self, attr)[pos].tolist() for attr in attrs]
+        names = self.names
+        for k, (a, b) in enumerate(zip(src.tolist(), dst.tolist())):
+            if self.directed or a < b:
+                G.add_edge(names[a], names[b], **{attr: col[k] for attr, col in zip(attrs, columns)})
+        return G
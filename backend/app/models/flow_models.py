@@ -1,8 +1,106 @@
+import math
+from array import array
 from dataclasses import dataclass
+import numpy as np
 
+# math.inf capacities (the garage -> route arcs) are stored as this
+INF_CAPACITY = np.iinfo(np.int64).max // 4
+# the solvers relax rows up to this long arc by arc, longer ones as NumPy slices
+SHORT_ROW = 32
+
+# One arc of the residual lists the solvers used before ResidualGraph (graph[u] = [FlowEdge, ...],
+# rev = index of the reverse arc in graph[to]). The solvers no longer take these; kept for callers
+# that build such lists themselves.
 @dataclass
 class FlowEdge:
     to: int
     capacity: float
     cost: float
     rev: int
+
+# Residual network as a struct of arrays. add_edge only appends the arc to compact buffers;
+# compile() lays out every arc and its reverse in CSR rows (row u = offsets[u]:offsets[u+1])
+# of the NumPy arrays to / cap / cost, with rev[p] = position of the reverse of arc p.
+# The solvers run on the compiled arrays and change cap in place, so the flow on an arc is
+# the capacity of its reverse. Capacities are whole buses (int64).
+class ResidualGraph:
+    def __init__(self, n):
+        self.n = n
+        self._tail = array('i')
+        self._head = array('i')
+        self._cap = array('q')
+        self._cost = array('d')
+        self.offsets = None
+        self.to = self.cap = self.cost = self.rev = self.forward = None
+        self.parallel = False  # some row has two arcs to the same node
+        self.potential = None  # duals left by the last solve, warm starts reuse them
+
+    def __len__(self):
+        return self.n
+
+    def add_edge(self, u, v, capacity, cost):
+        if self.offsets is not None:
+            raise RuntimeError("ResidualGraph is compiled, arcs can no longer be added")
+        if capacity == math.inf:
+            capacity = INF_CAPACITY
+        elif capacity != int(capacity):
+            raise ValueError(f"ResidualGraph capacities are whole units (or math.inf), got {capacity!r}")
+        self._tail.append(u)
+        self._head.append(v)
+        self._cap.append(int(capacity))
+        self._cost.append(cost)
+
+    def compile(self):
+        if self.offsets is not None:
+            return self
+        m = len(self._tail)
+        index = np.int32 if 2 * m < 2**31 else np.int64
+        tail = np.frombuffer(self._tail, dtype=np.intc)
+        head = np.frombuffer(self._head, dtype=np.intc)
+
+        # parallel arcs in a row: the same pair twice, in either direction
+        pairs = np.sort(np.minimum(tail, head).astype(np.int64) * self.n + np.maximum(tail, head))
+        self.parallel = bool(np.any(pairs[1:] == pairs[:-1]))
+        del pairs
+
+        # arc i and its reverse m + i, sorted into rows by their source node
+        src = np.concatenate((tail, head))
+        order = np.argsort(src, kind='stable')
+        self.offsets = np.zeros(self.n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=self.n), out=self.offsets[1:])
+        del src
+        self.to = np.concatenate((head, tail))[order].astype(index, copy=False)
+        cap = np.frombuffer(self._cap, dtype=np.int64)
+        self.cap = np.concatenate((cap, np.zeros(m, dtype=np.int64)))[order]
+        cost = np.frombuffer(self._cost, dtype=np.float64)
+        self.cost = np.concatenate((cost, -cost))[order]
+        del tail, head, cap, cost
+        self._tail = self._head = self._cap = self._cost = None
+
+        self.forward = order < m
+        position = np.empty(2 * m, dtype=index)
+        position[order] = np.arange(2 * m, dtype=index)
+        order += m
+        order %= max(2 * m, 1)
+        self.rev = position[order]
+        return self
+
+    def arcs(self, u):
+        return range(int(self.offsets[u]), int(self.offsets[u + 1]))
+
+    def flow(self, p):
+        return int(self.cap[self.rev[p]])
+
+    def flow_cost(self):
+        forward = np.flatnonzero(self.forward)
+        return float(self.cap[self.rev[forward]] @ self.cost[forward])
+
+    def tails(self):
+        # source node of every arc position
+        return np.repeat(np.arange(self.n, dtype=self.to.dtype), np.diff(self.offsets))
+
+def cheapest_per_target(targets, values, idx):
+    # of the candidate arcs idx (into targets / values), keep the cheapest one per target node
+    idx = idx[np.argsort(values[idx], kind='stable')]
+    _, first = np.unique(targets[idx], return_index=True)
+    return idx[first]
@@ -1,8 +1,10 @@
 # here we combine everything
 from app.services import *
 import networkx as nx
+import time
+import random
 from math import ceil
-from app.models import Route
+from app.models import Route, CSRGraph
 from app.utils import RouteDemandCalculator
 from app.utils import sample, rand_num
 
@@ -14,27 +16,120 @@ def people_to_buses(people: float) -> int:
 class RouteManager:
     # the desired route lenght in minutes (approx.), one way
     # using a list to be able to return to the initial graph after removing edges
-    def __init__(self, G: nx.Graph, route_length = 45, min_inter_station_time = 1, max_inter_station_time = 10, verbose: bool = False):
+    # workers: processes used by the parallel build stages (None = all cores)
+    # centrality_samples / centrality_error: approximate the centrality from sampled sources (large maps)
+    # landmarks: ALT landmarks used to guide A* on the map and on the route network (0 = unguided, opt-in)
+    # contraction: answer /user_path from a contraction hierarchy of the route network instead of A* (opt-in)
+    # hub_neighbors: keep only each hub's k nearest hubs in the hub graph (None = complete graph)
+    # leg_costs: "matrix" anneals each cluster on a precomputed station cost matrix (faster, approximate)
+    # annealing: extra simulated_annealing options, e.g. {'patience': 100, 'time_budget': 0.5, 'adaptive': True}
+    # partitioner: clustering backend ("multilevel", "metis", "spectral" or "auto"), falls back to multilevel
+    # partition: extra partitioner options, e.g. {'refine': False}
+    # flow_engine: min cost flow engine for the garage -> route fleet assignment (see min_cost_flow)
+    def __init__(self, G: nx.Graph, route_length = 45, min_inter_station_time = 1, max_inter_station_time = 10, verbose: bool = False,
+                 workers: int = 1, centrality_samples: int | None = None, centrality_error: float | None = None,
+                 landmarks: int = 0, contraction: bool = False, hub_neighbors: int | None = None,
+                 leg_costs: str = "exact", annealing: dict | None = None,
+                 partitioner: str = "multilevel", partition: dict | None = None, flow_engine: str = "spfa"):
         self.Routes = []
         self.Routes_obj = {'obj': [], 'total_demand': 0}
         self.Garages = {}
         
         self.main_graph = G
+        self.csr = CSRGraph.from_networkx(G)  # interned once, shared by the build stages
         self.route_length = route_length
         self.min_inter_station_time = min_inter_station_time
         self.max_inter_station_time = max_inter_station_time
+        self.workers = workers
+        self.centrality_samples = centrality_samples
+        self.centrality_error = centrality_error
+        self.landmark_count = landmarks
+        self.landmarks = LandmarkHeuristic(self.csr, k=landmarks) if landmarks else None
+        self.contraction = contraction
+        self.hub_neighbors = hub_neighbors
+        self.leg_costs = leg_costs
+        self.annealing = annealing or {}
+        self.partitioner = partitioner
+        self.partition = partition or {}
+        self.flow_engine = flow_engine
         
         self.RDC = RouteDemandCalculator(G)
         self.gen_routes(verbose)
+        self.route_index = RouteNetworkIndex(self.Routes[-1], contraction=contraction, landmarks=landmarks)
         self.assign_random_garages(ratio=0.04)
         print(f'[GARAGES] Chosen garages: {self.Garages}')
-        self.flow_solution = solve_min_cost_flow(
-            G=self.main_graph,
+        self.closed_roads = []  # roads removed since the last reset, closed to the buses too
+        self.flow_solution = self.solve_fleet()
+
+    def solve_fleet(self):
+        # cold solve of the garage -> route assignment, keeps what a warm re-solve starts from
+        self.flow_stats = {}
+        self.flow_warm = {}
+        return solve_min_cost_flow(
+            G=self.csr.masked(remove_edges=self.closed_roads),
             R=self.Routes[0],
             routes_obj=self.Routes_obj,
-            garages_supply=self.Garages
+            garages_supply=self.Garages,
+            engine=self.flow_engine,
+            stats=self.flow_stats,
+            workers=self.workers,
+            warm=self.flow_warm
         )
 
+    def reoptimize_fleet(self):
+        # re-solve the fleet assignment after the map changed, from the previous flow and duals;
+        # flow_stats['saved'] = augmentations the warm start saved compared with the cold solve
+        # the route network has already changed by now, so a failed solve only keeps the old assignment
+        try:
+            if not self.flow_warm:
+                self.flow_solution = self.solve_fleet()
+                return self.flow_solution
+            self.flow_stats = {}
+            self.flow_solution = resolve_min_cost_flow(
+                G=self.csr.masked(remove_edges=self.closed_roads),
+                routes_obj=self.Routes_obj,
+                warm=self.flow_warm,
+                stats=self.flow_stats,
+                workers=self.workers
+            )
+        except Exception as e:
+            # the warm state may be half updated, the next change starts cold
+            print(f"[FLEET] Re-optimisation failed, keeping the previous assignment: {e}")
+            self.flow_warm = {}
+            return self.flow_solution
+        print(f"[FLEET] Re-optimised {self.flow_stats['changed']} garage -> route arcs with "
+              f"{self.flow_stats['augmentations']} augmentations ({self.flow_stats['saved']} fewer than cold)")
+        return self.flow_solution
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # caches pickled before the route index existed get it built on load
+        if 'route_index' not in state:
+            self.__dict__.setdefault('landmark_count', 0)
+            self.__dict__.setdefault('landmarks', None)
+            self.__dict__.setdefault('contraction', False)
+            self.route_index = RouteNetworkIndex(self.Routes[-1], contraction=self.contraction,
+                                                 landmarks=self.landmark_count)
+        # caches pickled before the CSR map / the warm fleet re-solve: the map is interned again and
+        # the fleet starts cold on the next road closure
+        if 'csr' not in state:
+            self.csr = CSRGraph.from_networkx(self.main_graph)
+        for name, default in (('workers', 1), ('flow_engine', "spfa"), ('flow_stats', {}), ('flow_warm', {}),
+                              ('closed_roads', [])):
+            self.__dict__.setdefault(name, default)
+
+    @property
+    def network_version(self):
+        # bumped on every change of the route network (remove_road, reset_routes)
+        return self.route_index.version
+
+    def reset_routes(self):
+        self.Routes = [self.Routes[0]]
+        self.route_index.rebuild(self.Routes[0])
+        if self.closed_roads:
+            self.closed_roads = []
+            self.reoptimize_fleet()
+
     def compute_time(self, path):
         res = 0
         for i in range(len(path)-1):
@@ -43,37 +138,75 @@ class RouteManager:
 
     def compute_hub_graph(self, hubs, astar):
         hub_nodes = list([hub[1] for hub in hubs])
+        if self.hub_neighbors is not None and self.hub_neighbors < len(hub_nodes) - 1:
+            return self.compute_sparse_hub_graph(hub_nodes, astar, self.hub_neighbors)
+
         G = nx.Graph()
         avg_time = 0
 
         # add nodes
         G.add_nodes_from(hub_nodes)
 
+        # one search per hub towards the hubs after it, summing weight and travel time together
+        travel_time = {'travel_time': self.csr.adjacency('travel_time')}
         for i in range(len(hub_nodes)):
-            for j in range(i+1, len(hub_nodes)):
-                u = hub_nodes[i]
-                v = hub_nodes[j]
-
-                res = astar.find_path(u, v)
-                avg_time += self.compute_time(res['path'])
-
-                G.add_edge(u, v, weight=res['total_time'])
+            u = hub_nodes[i]
+            results = astar.find_paths(u, hub_nodes[i+1:], extra=travel_time)
+            for v in hub_nodes[i+1:]:
+                avg_time += results[v]['travel_time']
+                G.add_edge(u, v, weight=results[v]['total_time'])
 
         avg_time /= (len(hub_nodes) * (len(hub_nodes) - 1)) / 2
         return G, avg_time
 
+    def compute_sparse_hub_graph(self, hub_nodes, astar, k):
+        # every hub keeps its k nearest hubs; components are then joined by their cheapest link
+        G = nx.Graph()
+        G.add_nodes_from(hub_nodes)
+        travel_time = {'travel_time': self.csr.adjacency('travel_time')}
+
+        def link(u, results):
+            for v, res in results.items():
+                if res['path'] and (not G.has_edge(u, v) or res['total_time'] < G[u][v]['weight']):
+                    G.add_edge(u, v, weight=res['total_time'], travel_time=res['travel_time'])
+
+        for u in hub_nodes:
+            others = [v for v in hub_nodes if v != u]
+            link(u, astar.find_paths(u, others, extra=travel_time, limit=k))
+
+        components = list(nx.connected_components(G))
+        while len(components) > 1:
+            smallest = min(components, key=len)
+            outside = [v for v in hub_nodes if v not in smallest]
+            best = None
+            for u in smallest:
+                for v, res in astar.find_paths(u, outside, extra=travel_time, limit=1).items():
+                    if res['path'] and (best is None or res['total_time'] < best[2]['total_time']):
+                        best = (u, v, res)
+            if best is None:
+                break  # the map itself is disconnected
+            link(best[0], {best[1]: best[2]})
+            components = list(nx.connected_components(G))
+
+        avg_time = sum(t for _, _, t in G.edges(data='travel_time')) / max(1, G.number_of_edges())
+        return G, avg_time
 
     def assign_routes(self, R: nx.MultiGraph, route: list, number: int, astar: AStarTransport):
-        demand = self.RDC.bottleneck_demand(route)
+        # hub-level routes can step between stations that aren't adjacent on the map
+        stations = [route[0]]
+        for i in range(len(route)-1):
+            path = [route[i], route[i+1]] if self.main_graph.has_edge(route[i], route[i+1]) else astar.find_path(route[i], route[i+1])['path']
+            stations.extend(path[1:])
+
+        demand = self.RDC.bottleneck_demand(stations)
         demand = people_to_buses(demand)
         self.Routes_obj['obj'].append(Route(route, number, demand))
         self.Routes_obj['total_demand'] += demand
         
-        for i in range(len(route)-1):
-            path = [route[i], route[i+1]] if self.main_graph.has_edge(route[i], route[i+1]) else astar.find_path(route[i], route[i+1])['path']
-            for j in range(len(path)-1):
-                R.add_edge(path[j], path[j+1], number = number, travel_time = self.main_graph[path[j]][path[j+1]]['travel_time'], 
-                        traffic = self.main_graph[path[j]][path[j+1]]['traffic'], weight = self.main_graph[path[j]][path[j+1]]['weight'])
+        for j in range(len(stations)-1):
+            a, b = stations[j], stations[j+1]
+            R.add_edge(a, b, number = number, travel_time = self.main_graph[a][b]['travel_time'], 
+                    traffic = self.main_graph[a][b]['traffic'], weight = self.main_graph[a][b]['weight'])
         return [number, route]
 
 
@@ -84,47 +217,68 @@ class RouteManager:
         R.add_nodes_from(G.nodes())
         self.Routes = [R]
 
-        astarG = AStarTransport(G)
+        astarG = AStarTransport(self.csr, landmarks=self.landmarks)
 
-        res = {'betweeness_centrality': betweenness_centrality(G, astarG, verbose=verbose), 'routes': []}
+        res = {'betweeness_centrality': betweenness_centrality(G, astarG, verbose=verbose, workers=self.workers,
+                                                               samples=self.centrality_samples,
+                                                               epsilon=self.centrality_error),
+               'routes': []}
         print('Generated scores for all nodes with BC.')
 
-        working_G = G
+        working_G = self.csr
 
         avg_time = (self.min_inter_station_time+self.max_inter_station_time)/2
+        res['level_times'] = self.level_times = []  # seconds per hierarchy level
+        self.annealing_stats = []  # per level, the simulated_annealing stats of every cluster
+        self.partition_stats = []  # per level, cut / balance / time of the clustering
         while True:
+            level_started = time.perf_counter()
             total_stations = working_G.number_of_nodes()
             stations_per_route = self.route_length/avg_time + 1
             if (int(stations_per_route) == 1): stations_per_route+=1
             k_clusters = ceil(total_stations/stations_per_route)
             #1. clustering
-            parts, clusters = metis_partition(working_G, k=k_clusters, balance_tol=0.05, scale=100)
-            #2. get routes
-            for i, cluster in clusters.items():
-                route, cost, _ = simulated_annealing(working_G, cluster, temperature=500, max_iter=500, alpha=0.97)
+            partition_stats = {}
+            options = {'workers': self.workers, **self.partition}
+            parts, clusters = partition_graph(working_G, k=k_clusters, backend=self.partitioner, balance_tol=0.05,
+                                              scale=100, stats=partition_stats, **options)
+            self.partition_stats.append(partition_stats)
+            #2. get routes (clusters are annealed independently, then merged here in cluster order)
+            seeds = [random.getrandbits(32) for _ in clusters]
+            level_stats = []
+            params = {'temperature': 500, 'max_iter': 500, 'alpha': 0.97, 'leg_costs': self.leg_costs, **self.annealing}
+            annealed = anneal_clusters(working_G, list(clusters.values()), seeds, workers=self.workers,
+                                       heuristic_func=self.landmarks, stats=level_stats, **params)
+            self.annealing_stats.append(level_stats)
+            for route, cost, _ in annealed:
                 res['routes'].append(self.assign_routes(R, route, len(res['routes']), astarG))
                 if verbose: print(f"Used SA to generate route {res['routes'][-1][0]} with cost {cost}.")
                 if cost == float('inf'): raise Exception("Can't have infinite cost!")
                 if verbose:
                     print(f"\n=== ROUTE {res['routes'][-1][0]} ===")
                     print('\n'.join([f'{route[i]} -> {route[i+1]}' for i in range(0, len(route)-1, 1)]))
-                
+
+            res['level_times'].append(time.perf_counter() - level_started)
+            iterations = sum(st['iterations'] for st in level_stats)
+            accepted = sum(st['accepted'] for st in level_stats)
+            print(f"Level {len(res['level_times'])}: {len(clusters)} routes in {res['level_times'][-1]:.2f}s "
+                  f"({partition_stats['backend']} partition {partition_stats['time']:.2f}s, cut {partition_stats['cut']:.1f}, "
+                  f"balance {partition_stats['balance']:.2f} (smallest {partition_stats['smallest']:.2f}); "
+                  f"{iterations} SA iterations, {accepted / max(1, iterations):.0%} accepted)")
 
             if (len(clusters) == 1): return (R, res)
             #3. gen hubs    
-            hubs = {pid: (float('-inf'), None) for pid in clusters}
-            for pid, cluster in clusters.items():
-                for node in cluster:
-                    score = res['betweeness_centrality'][node]
-                    if score > hubs[pid][0]:
-                        hubs[pid] = (score, node)
+            hubs = select_hubs(clusters, res['betweeness_centrality'])
             hubs_list = [hubs[pid] for pid in sorted(hubs.keys())]
 
             print('Computed hubs successfully!')
             #4. gen hub graph
-            working_G, avg_time = self.compute_hub_graph(hubs_list, astarG)
+            started = time.perf_counter()
+            hub_G, avg_time = self.compute_hub_graph(hubs_list, astarG)
+            working_G = CSRGraph.from_networkx(hub_G)
 
-            print('Computed hub graph successfully! Now running the whole thing again, but on the hubs')
+            print(f'Computed hub graph successfully ({len(hubs_list)} hubs, {time.perf_counter() - started:.2f}s)! '
+                  'Now running the whole thing again, but on the hubs')
 
     def remove_road(self, u, v):
         if not self.Routes[-1].has_edge(u, v):
@@ -141,10 +295,6 @@ class RouteManager:
             old_edges_attrs.append(attrs.copy())
             route_numbers.add(attrs["number"])
 
-        # --- build temp graph ---
-        temp_G = self.main_graph.copy()
-        temp_G.remove_edge(u, v)
-
         # --- remove nodes belonging to the same route ---
         nodes_to_remove = set()
 
@@ -157,10 +307,10 @@ class RouteManager:
         nodes_to_remove.discard(u)
         nodes_to_remove.discard(v)
 
-        temp_G.remove_nodes_from(nodes_to_remove)
-
         # --- compute alternative path ---
-        astar = AStarTransport(temp_G)
+        # on the map without this road, the roads closed before it and the route's own stations
+        temp_G = self.csr.masked(remove_edges=self.closed_roads + [(u, v)], remove_nodes=nodes_to_remove)
+        astar = AStarTransport(temp_G, landmarks=self.landmarks)
         result = astar.find_path(u, v)
         path = result["path"]
         print(path)
@@ -173,30 +323,23 @@ class RouteManager:
             R.remove_edge(u, v, key=k)
 
         # --- add detour edges using old attributes ---
+        added = []
         for i in range(len(path) - 1):
             a = path[i]
             b = path[i + 1]
             for attrs in old_edges_attrs:
                 R.add_edge(a, b, **attrs)
+                added.append((a, b, attrs["weight"]))
 
+        self.route_index.patch(removed=[(u, v)], added=added)
+        self.closed_roads.append((u, v))
+        self.reoptimize_fleet()
         return True
 
 
     def shortest_route_path(self, start, end):
         R = self.Routes[-1]
-        G_simple = nx.Graph()
-
-        for u, v, data in R.edges(data=True):
-            w = data["weight"]
-
-            if G_simple.has_edge(u, v):
-                if w < G_simple[u][v]["weight"]:
-                    G_simple[u][v]["weight"] = w
-            else:
-                G_simple.add_edge(u, v, weight=w)
-
-        astar = AStarTransport(G_simple)
-        result = astar.find_path(start, end)
+        result = self.route_index.find_path(start, end)
 
         path = result["path"]
         path_processed = {'order': []}
@@ -1,12 +1,34 @@
 import heapq
 import networkx as nx
 import math
+from functools import partial
+from app.models import CSRGraph
+from app.services.landmarks import LandmarkHeuristic
+
+# module level so an AStarTransport (e.g. in a pickled RouteNetworkIndex) can be pickled
+def _no_heuristic(n, end):
+    return 0
+
+def _euclidean(node_coords, n, end):
+    # euristica Euclidiana
+    return math.hypot(node_coords[end][0] - node_coords[n][0], node_coords[end][1] - node_coords[n][1])
 
 class AStarTransport:
     
-    def __init__(self, graph, node_coords=None, heuristic_func=None):
+    # count_expansions: keep the number of settled nodes in self.expansions (for benchmarks)
+    # landmarks: number of ALT landmarks to preprocess, or a ready LandmarkHeuristic to reuse
+    # bidirectional: find_path grows a frontier from both ends and stops when they provably meet
+    def __init__(self, graph, node_coords=None, heuristic_func=None, count_expansions=False, landmarks=None,
+                 bidirectional=False):
         
-        if isinstance(graph, (nx.Graph, nx.DiGraph)):
+        # reverse adjacency for the backward search; the same dicts when the graph is undirected
+        self._reverse = None
+        if isinstance(graph, (CSRGraph, nx.Graph, nx.DiGraph)) and not graph.is_directed():
+            self._reverse = True
+
+        if isinstance(graph, CSRGraph):
+            self.graph = graph.adjacency('weight')  # cached on the graph, shared by every instance
+        elif isinstance(graph, (nx.Graph, nx.DiGraph)):
             self.graph = {
                 n: {nbr: graph[n][nbr]['weight'] for nbr in graph.neighbors(n)}
                 for n in graph.nodes
@@ -14,38 +36,189 @@ class AStarTransport:
         else:
             self.graph = graph
 
+        if self._reverse is True:
+            self._reverse = self.graph
+
         self.node_coords = node_coords
+        self.guided = bool(heuristic_func or landmarks or node_coords)
+
+        if isinstance(landmarks, int) and landmarks > 0:
+            landmarks = LandmarkHeuristic(self.graph, k=landmarks)
 
         if heuristic_func:
             self.heuristic_func = heuristic_func
+        elif landmarks:
+            self.heuristic_func = landmarks
         elif node_coords:
-            # euristica Euclidiana
-            self.heuristic_func = lambda n, end: math.hypot(
-                node_coords[end][0] - node_coords[n][0],
-                node_coords[end][1] - node_coords[n][1]
-            )
+            self.heuristic_func = partial(_euclidean, node_coords)
         else:
-            self.heuristic_func = lambda n, end: 0
+            self.heuristic_func = _no_heuristic
 
-    def find_path(self, start_node, end_node):
-       
-        open_set = []
-        heapq.heappush(open_set, (0, start_node, [start_node]))  
+        self.count_expansions = count_expansions
+        self.expansions = 0
+        self.bidirectional = bidirectional
+
+    @staticmethod
+    def _reconstruct(parents, node):
+        path = []
+        while node is not None:
+            path.append(node)
+            node = parents[node]
+        path.reverse()
+        return path
+
+    # the heap only holds (f, g, node); paths are rebuilt from the parent pointers at the end.
+    # nodes are settled once, so the heuristic has to be consistent (true for 0 and Euclidean)
+    # avoid: nodes to treat as removed for this query only (a mask instead of a graph copy);
+    # such queries always run one way
+    def find_path(self, start_node, end_node, avoid=None):
+        if self.bidirectional and not avoid:
+            return self._find_path_bidirectional(start_node, end_node)
+
+        heuristic = self.heuristic_func
+        open_set = [(heuristic(start_node, end_node), 0, start_node)]
         g_scores = {start_node: 0}
+        parents = {start_node: None}
+        closed = set()
 
         while open_set:
-            f_score, current, path = heapq.heappop(open_set)
+            f_score, g, current = heapq.heappop(open_set)
+
+            if current in closed or g > g_scores[current]:
+                continue  # stale entry, a shorter one was already expanded
 
             if current == end_node:
-                return {'path': path, 'total_time': g_scores[current]}
+                return {'path': self._reconstruct(parents, current), 'total_time': g}
+
+            closed.add(current)
+            if self.count_expansions:
+                self.expansions += 1
 
             for neighbor, cost in self.graph.get(current, {}).items():
-                tentative_g = g_scores[current] + cost
+                if neighbor in closed or (avoid and neighbor in avoid):
+                    continue
+                tentative_g = g + cost
                 if neighbor not in g_scores or tentative_g < g_scores[neighbor]:
                     g_scores[neighbor] = tentative_g
-                    f_score_neighbor = tentative_g + self.heuristic_func(neighbor, end_node)
-                    heapq.heappush(open_set, (f_score_neighbor, neighbor, path + [neighbor]))
+                    parents[neighbor] = current
+                    heapq.heappush(open_set, (tentative_g + heuristic(neighbor, end_node), tentative_g, neighbor))
 
         return {'path': [], 'total_time': float('inf')}
 
+    # One-to-many: a single search from start that stops as soon as every target is settled.
+    # extra maps a name to another {u: {v: cost}} adjacency (e.g. travel_time) that is summed
+    # along the same shortest paths; each result gets it under that name next to 'total_time'.
+    # limit stops after that many targets (the nearest ones); the others are left out.
+    # Several targets share one search, so this one runs unguided.
+    def find_paths(self, start_node, targets, extra=None, limit=None):
+        extra = extra or {}
+        remaining = set(targets)
+        if limit is None:
+            limit = len(remaining)
+        results = {}
+        open_set = [(0, start_node)]
+        g_scores = {start_node: 0}
+        sums = {name: {start_node: 0} for name in extra}
+        parents = {start_node: None}
+        closed = set()
+
+        while open_set and remaining and len(results) < limit:
+            g, current = heapq.heappop(open_set)
+
+            if current in closed or g > g_scores[current]:
+                continue  # stale entry
+
+            closed.add(current)
+            if self.count_expansions:
+                self.expansions += 1
+
+            if current in remaining:
+                remaining.discard(current)
+                results[current] = {'path': self._reconstruct(parents, current), 'total_time': g,
+                                    **{name: sums[name][current] for name in extra}}
+
+            for neighbor, cost in self.graph.get(current, {}).items():
+                if neighbor in closed:
+                    continue
+                tentative_g = g + cost
+                if neighbor not in g_scores or tentative_g < g_scores[neighbor]:
+                    g_scores[neighbor] = tentative_g
+                    parents[neighbor] = current
+                    for name, adj in extra.items():
+                        sums[name][neighbor] = sums[name][current] + adj[current][neighbor]
+                    heapq.heappush(open_set, (tentative_g, neighbor))
+
+        if len(results) < limit:
+            for t in remaining:
+                results[t] = {'path': [], 'total_time': float('inf'), **{name: float('inf') for name in extra}}
+        return results
+
+    def _reverse_graph(self):
+        if self._reverse is None:
+            reverse = {n: {} for n in self.graph}
+            for u, nbrs in self.graph.items():
+                for v, cost in nbrs.items():
+                    reverse.setdefault(v, {})[u] = cost
+            self._reverse = reverse
+        return self._reverse
+
+    # Bidirectional search with the average potential p(v) = (h(v, end) - h(v, start)) / 2:
+    # forward keys are g + p, backward keys g - p, both consistent when h is. The best
+    # meeting cost mu is final once top_forward + top_backward >= mu.
+    def _find_path_bidirectional(self, start_node, end_node):
+        if start_node == end_node:
+            return {'path': [start_node], 'total_time': 0}
+
+        heuristic = self.heuristic_func
+        if self.guided:
+            potential = lambda n: (heuristic(n, end_node) - heuristic(n, start_node)) / 2
+        else:
+            potential = lambda n: 0
+
+        graphs = (self.graph, self._reverse_graph())
+        signs = (1, -1)
+        g_scores = ({start_node: 0}, {end_node: 0})
+        parents = ({start_node: None}, {end_node: None})
+        closed = (set(), set())
+        heaps = ([(potential(start_node), 0, start_node)], [(-potential(end_node), 0, end_node)])
+
+        mu = float('inf')
+        meet = None
+
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= mu:
+                break
+
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            other = 1 - side
+            f_score, g, current = heapq.heappop(heaps[side])
+
+            if current in closed[side] or g > g_scores[side][current]:
+                continue  # stale entry
+
+            closed[side].add(current)
+            if self.count_expansions:
+                self.expansions += 1
+
+            for neighbor, cost in graphs[side].get(current, {}).items():
+                if neighbor in closed[side]:
+                    continue
+                tentative_g = g + cost
+                if neighbor not in g_scores[side] or tentative_g < g_scores[side][neighbor]:
+                    g_scores[side][neighbor] = tentative_g
+                    parents[side][neighbor] = current
+                    heapq.heappush(heaps[side], (tentative_g + signs[side] * potential(neighbor), tentative_g, neighbor))
+
+                    if neighbor in g_scores[other] and tentative_g + g_scores[other][neighbor] < mu:
+                        mu = tentative_g + g_scores[other][neighbor]
+                        meet = neighbor
+
+        if meet is None:
+            return {'path': [], 'total_time': float('inf')}
 
+        path = self._reconstruct(parents[0], meet)
+        node = parents[1][meet]
+        while node is not None:
+            path.append(node)
+            node = parents[1][node]
+        return {'path': path, 'total_time': mu}
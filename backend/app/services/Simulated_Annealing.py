@@ -1,70 +1,324 @@
 import random
 import math
+import time
+import numpy as np
 import networkx as nx
+from scipy.sparse.csgraph import dijkstra
+from app.models import CSRGraph
 from app.services import AStarTransport 
+from app.utils.process_pool import map_tasks
+
+def leg_cost_matrix(G: CSRGraph, G_alternative: CSRGraph, stations):
+    # D[a, b]: cost of the leg stations[a] -> stations[b]; the direct edge when there is one
+    # (structure over cost), else the shortest path in the loop-avoiding graph
+    idx = [G.index[s] for s in stations]
+    D = dijkstra(G_alternative.to_scipy('weight'), directed=True, indices=idx)[:, idx]
+    weights = G.adjacency('weight')
+    for a, u in enumerate(stations):
+        for b, v in enumerate(stations):
+            if v in weights.get(u, {}):
+                D[a, b] = weights[u][v]
+    return D
+
+# Temperature, acceptance test and stopping rules shared by both costing modes.
+# With only max_iter set it is the plain geometric schedule (and draws the same randoms).
+# patience: stop after this many iterations without a new best
+# min_temperature: stop once the temperature drops below this
+# time_budget: stop after this many seconds
+# adaptive: every ADAPT_WINDOW iterations quench while almost everything is accepted
+#   and reheat (up to the start temperature) when nothing is accepted and nothing improves
+class _Schedule:
+    ADAPT_WINDOW = 50
+    HOT_RATE = 0.6
+    FROZEN_RATE = 0.02
+    QUENCH = 0.25
+    REHEAT = 2.0
+
+    def __init__(self, temperature, max_iter, alpha, patience=None, min_temperature=None,
+                 time_budget=None, adaptive=False):
+        self.start_temperature = self.temperature = temperature
+        self.max_iter = max_iter
+        self.alpha = alpha
+        self.patience = patience
+        self.min_temperature = min_temperature
+        self.deadline = time.perf_counter() + time_budget if time_budget is not None else None
+        self.adaptive = adaptive
+        self.iterations = 0
+        self.accepted = 0
+        self.improvements = 0
+        self.reheats = 0
+        self.since_best = 0
+        self.stopped = None
+        self._window = (0, 0)  # (accepted, improvements) at the start of the window
+
+    def running(self):
+        if self.iterations >= self.max_iter:
+            self.stopped = "max_iter"
+        elif self.patience is not None and self.since_best >= self.patience:
+            self.stopped = "patience"
+        elif self.min_temperature is not None and self.temperature < self.min_temperature:
+            self.stopped = "temperature"
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.stopped = "time"
+        return self.stopped is None
+
+    def accept(self, delta):
+        # accept if the new route is better or by probability
+        if delta < 0 or random.random() < math.exp(-delta / self.temperature):
+            self.accepted += 1
+            return True
+        return False
+
+    def step(self, improved):
+        self.iterations += 1
+        if improved:
+            self.improvements += 1
+            self.since_best = 0
+        else:
+            self.since_best += 1
+
+        # cool the temp.
+        self.temperature *= self.alpha
+        if self.adaptive and self.iterations % self.ADAPT_WINDOW == 0:
+            accepted, improvements = self._window
+            rate = (self.accepted - accepted) / self.ADAPT_WINDOW
+            if rate > self.HOT_RATE:
+                self.temperature *= self.QUENCH
+            elif rate < self.FROZEN_RATE and self.improvements == improvements:
+                self.temperature = min(self.start_temperature, self.temperature * self.REHEAT)
+                self.reheats += 1
+            self._window = (self.accepted, self.improvements)
+
+    def stats(self, stations, started):
+        return {
+            'stations': stations,
+            'iterations': self.iterations,
+            'accepted': self.accepted,
+            'acceptance_rate': self.accepted / self.iterations if self.iterations else 0.0,
+            'improvements': self.improvements,
+            'reheats': self.reheats,
+            'stopped': self.stopped,
+            'time': time.perf_counter() - started,
+        }
+
+def _anneal_on_matrix(D, route, schedule, batch):
+    # route: station positions in D. Every iteration draws `batch` swaps, costs them all at
+    # once from the matrix and runs the usual acceptance test on the cheapest one.
+    current = np.array(route)
+    current_cost = float(D[current[:-1], current[1:]].sum())
+    best, best_cost = current, current_cost
+    rows = np.arange(batch)
+
+    while schedule.running():
+        pairs = np.array([random.sample(range(1, len(route)-1), 2) for _ in range(batch)])
+        I, J = pairs[:, 0], pairs[:, 1]
+        candidates = np.repeat(current[None, :], batch, axis=0)
+        candidates[rows, I] = current[J]
+        candidates[rows, J] = current[I]
+        costs = D[candidates[:, :-1], candidates[:, 1:]].sum(axis=1)
+
+        pick = int(np.argmin(costs))
+        new_cost = float(costs[pick])
+        improved = False
+        if schedule.accept(new_cost - current_cost):
+            current, current_cost = candidates[pick], new_cost
+            if new_cost < best_cost:
+                best, best_cost = current, new_cost
+                improved = True
+        schedule.step(improved)
+
+    return best.tolist()
+
+# G can be a networkx graph or a CSRGraph; edge/node removals below are masked views, not copies
+# heuristic_func: optional admissible A* heuristic for the gap searches (e.g. a LandmarkHeuristic)
+# leg_costs: "exact" costs every candidate route leg by leg, like the route that is returned;
+#   "matrix" anneals on a precomputed station-to-station cost matrix of the cluster (legs
+#   ignore each other's detours there) and only expands the best route into a real path;
+#   when that path (and the raw order) is infinite it falls back to "exact" (stats['fallback'])
+# The first and last station stay put, unless no order between them has a finite cost
+# batch: candidate swaps evaluated together per iteration in "matrix" mode
+# patience, min_temperature, time_budget, adaptive: extra stopping rules / cooling, see _Schedule
+# stats: optional dict, filled with the iteration count, acceptance rate and why the run stopped
+def simulated_annealing(G: nx.Graph | CSRGraph, raw_route, temperature=100.0, max_iter=50, alpha=0.99, heuristic_func=None,
+                        leg_costs="exact", batch=1, patience=None, min_temperature=None, time_budget=None,
+                        adaptive=False, stats=None):
+    started = time.perf_counter()
+    if leg_costs not in ("exact", "matrix"):
+        raise ValueError(f"Unknown leg_costs mode: {leg_costs}")
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.from_networkx(G)
 
-def simulated_annealing(G: nx.Graph, raw_route, temperature=100.0, max_iter=50, alpha=0.99):
     #solves the loop problem:
-    G_alternative = G.copy()
+    route_edges = []
     for i in range(len(raw_route) - 1):
         u = raw_route[i]
         v = raw_route[i + 1]
-        
-        if G_alternative.has_edge(u, v):
-            G_alternative.remove_edge(u, v)
-        if G_alternative.has_edge(v, u):   # even tho our graph isn't dirrected, I would still check this just in case
-            G_alternative.remove_edge(v, u)
+        route_edges.append((u, v))
+        route_edges.append((v, u))   # even tho our graph isn't dirrected, I would still check this just in case
+    G_alternative = G.masked(remove_edges=route_edges)
 
-    a_star_solver = AStarTransport(G_alternative)  # A* instance to calculate routes between nodes that aren't dirrectly connecting, but avoiding loops
+    a_star_solver = AStarTransport(G_alternative, heuristic_func=heuristic_func)  # A* instance to calculate routes between nodes that aren't dirrectly connecting, but avoiding loops
+    weights = G.adjacency('weight')
 
-    # total route cost
-    def total_cost(r):
-        cost = 0
-        actual_route = [r[0]]
-        G_alternative_temp = G_alternative.copy()
-        for i in range(len(r)-1):
+    # A route is costed leg by leg. A gap leg (no direct edge) is searched in G_alternative
+    # while avoiding the off-route nodes earlier gap legs already went through, so every leg
+    # is a function of (its two stations, the nodes used before it). A state keeps those per
+    # leg; a swap at i < j only re-costs from leg i-1 and reuses any later leg whose inputs
+    # didn't change, which gives exactly the costs and paths of a full re-evaluation.
+    stations = set(raw_route)
+    no_nodes = frozenset()
+
+    def used_before(state, k):
+        return state['used_after'][k-1] if k > 0 else no_nodes
+
+    def cost_legs(r, base=None, first=0):
+        if base is None:
+            first = 0
+            costs, paths, used_after = [], [], []
+        else:
+            costs, paths, used_after = base['costs'][:first], base['paths'][:first], base['used_after'][:first]
+        used = used_after[-1] if used_after else no_nodes
+
+        for k in range(first, len(r)-1):
+            u, v = r[k], r[k+1]
             #prioritize structure over cost
-            if G.has_edge(r[i], r[i+1]):
-                cost += G[r[i]][r[i+1]]['weight']
-                actual_route.append(r[i+1])
-            else: 
-                res = AStarTransport(G_alternative_temp).find_path(r[i], r[i+1])
-                actual_route.extend(res['path'][1:])
-                for x in res['path']:
-                    if x not in r:
-                        if G_alternative_temp.has_node(x):
-                            G_alternative_temp.remove_node(x)
-                        else: raise Exception("Somehow the node disappeared!")
-                cost += res['total_time']
-        
-        return cost, actual_route
-
-    current_route = raw_route[:]
-    current_cost, actual_route = total_cost(current_route)
-    best_actual_route = actual_route[:]
-    best_route = current_route[:]
-    best_cost = current_cost
-
-    for iteration in range(max_iter):
-        # small change: swap between 2 nodes (except first and last)
-        if len(raw_route) > 3:  # check to have min 3 nodes for swap
-            i, j = random.sample(range(1, len(raw_route)-1), 2)
+            if v in weights.get(u, {}):
+                cost, path = weights[u][v], [v]
+            elif base is not None and base['route'][k] == u and base['route'][k+1] == v and used_before(base, k) == used:
+                cost, path = base['costs'][k], base['paths'][k]
+                used = base['used_after'][k]
+            else:
+                res = a_star_solver.find_path(u, v, avoid=used)
+                cost, path = res['total_time'], res['path'][1:]
+                fresh = [x for x in res['path'] if x not in stations]
+                if fresh:
+                    used = used | frozenset(fresh)
+            costs.append(cost)
+            paths.append(path)
+            used_after.append(used)
+
+        return {'route': r, 'costs': costs, 'paths': paths, 'used_after': used_after}
+
+    def total(state):
+        cost = 0
+        for c in state['costs']:
+            cost += c
+        return cost
+
+    def actual(state):
+        actual_route = [state['route'][0]]
+        for p in state['paths']:
+            actual_route.extend(p)
+        return actual_route
+
+    schedule = _Schedule(temperature, max_iter, alpha, patience, min_temperature, time_budget, adaptive)
+
+    def finish(result):
+        if stats is not None:
+            stats.update(schedule.stats(len(raw_route), started))
+        return result
+
+    def anneal(schedule, movable):
+        # swaps two of the positions in movable per iteration, returns (actual route, cost, route)
+        current_route = raw_route[:]
+        current_state = cost_legs(current_route)
+        current_cost = total(current_state)
+        best_actual_route = actual(current_state)
+        best_route = current_route[:]
+        best_cost = current_cost
+
+        while schedule.running():
+            # small change: swap between 2 nodes
+            i, j = random.sample(movable, 2)
             new_route = current_route[:]
             new_route[i], new_route[j] = new_route[j], new_route[i]
 
-            new_cost, new_actual_route = total_cost(new_route)
-            delta = new_cost - current_cost
+            # legs before min(i, j) - 1 are untouched
+            new_state = cost_legs(new_route, current_state, max(min(i, j) - 1, 0))
+            new_cost = total(new_state)
 
-            # accept if the new route is better or by probability
-            if delta < 0 or random.random() < math.exp(-delta / temperature):
+            improved = False
+            # inf -> inf is a sideways move, not nan
+            if schedule.accept(new_cost - current_cost if new_cost != current_cost else 0.0):
                 current_route = new_route
+                current_state = new_state
                 current_cost = new_cost
                 if new_cost < best_cost:
                     best_route = new_route
                     best_cost = new_cost
-                    best_actual_route = new_actual_route
+                    best_actual_route = actual(new_state)
+                    improved = True
+            schedule.step(improved)
 
-        # cool the temp.
-        temperature *= alpha
+        return best_actual_route, best_cost, best_route
+
+    def free_ends():
+        # a dead-end station (its one road leads out of the cluster) only fits at an end of the
+        # route, so when first and last can't stay put every station may move
+        nonlocal schedule
+        schedule = _Schedule(temperature, max_iter, alpha, patience, min_temperature, time_budget, adaptive)
+        if stats is not None:
+            stats['fallback'] = "free_ends"
+        return anneal(schedule, range(len(raw_route)))
+
+    # with 3 stations or less there is nothing to swap (first and last stay put)
+    if len(raw_route) <= 3:
+        schedule.stopped = "trivial"
+        state = cost_legs(raw_route[:])
+        if total(state) < math.inf or len(raw_route) < 3:
+            return finish((actual(state), total(state), raw_route[:]))
+        return finish(free_ends())
+
+    if leg_costs == "matrix":
+        names = list(dict.fromkeys(raw_route))
+        position = {s: a for a, s in enumerate(names)}
+        D = leg_cost_matrix(G, G_alternative, names)
+        order = _anneal_on_matrix(D, [position[s] for s in raw_route], schedule, batch)
+        best_route = [names[a] for a in order]
+        # the matrix can misjudge routes whose detours collide; never return worse than we got
+        best_state, raw_state = cost_legs(best_route), cost_legs(raw_route[:])
+        if total(raw_state) <= total(best_state):
+            best_route, best_state = raw_route[:], raw_state
+        if total(best_state) < math.inf:
+            return finish((actual(best_state), total(best_state), best_route))
+        # both dead-end on colliding detours, which the matrix can't see: anneal leg by leg
+        schedule = _Schedule(temperature, max_iter, alpha, patience, min_temperature, time_budget, adaptive)
+        if stats is not None:
+            stats['fallback'] = "exact"
+
+    result = anneal(schedule, range(1, len(raw_route)-1))
+    if result[1] == math.inf:
+        result = free_ends()
+    return finish(result)
+
+def _anneal_cluster(G, cluster, seed, heuristic_func, params):
+    # every cluster runs on its own seed, so the result doesn't depend on where it ran;
+    # the caller's random state is put back, as if it had run in a worker
+    state = random.getstate()
+    random.seed(seed)
+    stats = {}
+    try:
+        return simulated_annealing(G, cluster, heuristic_func=heuristic_func, stats=stats, **params), stats
+    finally:
+        random.setstate(state)
+
+def _cluster_task(level, task):
+    G, heuristic_func, params = level
+    cluster, seed = task
+    return _anneal_cluster(G, cluster, seed, heuristic_func, params)
+
+# Anneals the clusters of one level; they don't share anything until their routes are merged.
+# seeds: one per cluster (same order). Results come back in cluster order for any worker
+# count, so with the same seeds workers=1 and workers=8 give the same routes.
+# workers > 1 spreads the clusters over a process pool (None = all cores).
+# stats: optional list, gets the simulated_annealing stats of every cluster appended (same order)
+def anneal_clusters(G: nx.Graph | CSRGraph, clusters, seeds, workers=1, heuristic_func=None, stats=None, **params):
+    if not isinstance(G, CSRGraph):
+        G = CSRGraph.from_networkx(G)
+    tasks = list(zip(clusters, seeds))
+
+    done = list(map_tasks(_cluster_task, (G, heuristic_func, params), tasks, workers=workers))
 
-    return best_actual_route, best_cost, best_route
+    if stats is not None:
+        stats.extend(cluster_stats for _, cluster_stats in done)
+    return [result for result, _ in done]
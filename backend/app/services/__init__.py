@@ -1,6 +1,11 @@
 from .mini_metis import metis_partition
+from .partitioners import partition_graph, available_partitioners, PARTITIONERS
+from .landmarks import LandmarkHeuristic
 from .A_star import AStarTransport
-from .Simulated_Annealing import simulated_annealing
-from .hub_selector import betweenness_centrality
+from .contraction_hierarchy import ContractionHierarchy
+from .route_index import RouteNetworkIndex, collapse_routes
+from .Simulated_Annealing import simulated_annealing, anneal_clusters
+from .hub_selector import betweenness_centrality, select_hubs, hub_agreement, samples_for_error
 from .spfa import spfa
-from .min_cost_flow_solver import solve_min_cost_flow
\ No newline at end of file
+from .dijkstra_potentials import dijkstra_potentials
+from .min_cost_flow_solver import solve_min_cost_flow, min_cost_flow, resolve_min_cost_flow, reoptimize_min_cost_flow
\ No newline at end of file
@@ -0,0 +1,168 @@
+import heapq
+import math
+import networkx as nx
+from app.models import CSRGraph
+
+# Contraction hierarchy over an undirected weighted graph. Nodes are contracted one by one
+# (cheapest edge difference first); whenever the only shortest u-w path runs through the
+# contracted node v, a shortcut u-w remembering v is added. A query is then a bidirectional
+# search that only climbs to higher-ranked nodes, so it settles a few dozen nodes no matter
+# how big the network is. find_path returns the same {'path', 'total_time'} as AStarTransport.
+class ContractionHierarchy:
+    # witness searches give up after this many settled nodes (may add a redundant shortcut)
+    WITNESS_SETTLE_LIMIT = 60
+
+    def __init__(self, graph, weight="weight"):
+        if isinstance(graph, CSRGraph):
+            graph = graph.adjacency(weight)
+        elif isinstance(graph, (nx.Graph, nx.DiGraph)):
+            graph = {n: {nbr: graph[n][nbr][weight] for nbr in graph.neighbors(n)} for n in graph.nodes}
+
+        self.rank = {}
+        self.up = {}       # node -> {higher ranked neighbor: cost}
+        self.middle = {}   # (u, w) -> contracted node the shortcut u-w jumps over
+        self._build(graph)
+
+    def _witness(self, adj, source, excluded, limit):
+        # distances from source within limit, not passing through excluded
+        dist = {source: 0}
+        heap = [(0, source)]
+        settled = 0
+        while heap and settled < self.WITNESS_SETTLE_LIMIT:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if d > limit:
+                break
+            settled += 1
+            for v, cost in adj[u].items():
+                nd = d + cost
+                if v != excluded and nd <= limit and nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _shortcuts(self, adj, v):
+        # shortcuts needed to contract v: [(u, w, cost)]
+        nbrs = list(adj[v].items())
+        shortcuts = []
+        for i, (u, cu) in enumerate(nbrs):
+            if i == len(nbrs) - 1:
+                break
+            limit = cu + max(cw for _, cw in nbrs[i + 1:])
+            dist = self._witness(adj, u, v, limit)
+            for w, cw in nbrs[i + 1:]:
+                if dist.get(w, math.inf) > cu + cw:
+                    shortcuts.append((u, w, cu + cw))
+        return shortcuts
+
+    @staticmethod
+    def _priority(adj, v, shortcuts, contracted_nbrs):
+        # edge difference plus how many neighbours are already gone (spreads contraction out)
+        return len(shortcuts) - len(adj[v]) + contracted_nbrs.get(v, 0)
+
+    def _build(self, graph):
+        adj = {}
+        for u, nbrs in graph.items():
+            adj.setdefault(u, {})
+            for v, cost in nbrs.items():
+                if u == v:
+                    continue
+                adj.setdefault(v, {})
+                # keep the cheaper one if the dict is not symmetric
+                if cost < adj[u].get(v, math.inf):
+                    adj[u][v] = cost
+                    adj[v][u] = cost
+
+        contracted_nbrs = {}
+        heap = [(self._priority(adj, v, self._shortcuts(adj, v), contracted_nbrs), i, v) for i, v in enumerate(adj)]
+        heapq.heapify(heap)
+
+        order = 0
+        while heap:
+            _, i, v = heapq.heappop(heap)
+            # lazy update: re-evaluate and put back if it is no longer the cheapest
+            shortcuts = self._shortcuts(adj, v)
+            priority = self._priority(adj, v, shortcuts, contracted_nbrs)
+            if heap and priority > heap[0][0]:
+                heapq.heappush(heap, (priority, i, v))
+                continue
+
+            for u, w, cost in shortcuts:
+                if cost < adj[u].get(w, math.inf):
+                    adj[u][w] = cost
+                    adj[w][u] = cost
+                    self.middle[(u, w)] = v
+                    self.middle[(w, u)] = v
+
+            self.rank[v] = order
+            order += 1
+            self.up[v] = dict(adj[v])  # everything still in the graph is ranked higher
+            for u in adj[v]:
+                del adj[u][v]
+                contracted_nbrs[u] = contracted_nbrs.get(u, 0) + 1
+            del adj[v]
+
+    def _unpack(self, path):
+        out = [path[0]]
+        for a, b in zip(path, path[1:]):
+            stack = [(a, b)]
+            while stack:
+                x, y = stack.pop()
+                m = self.middle.get((x, y))
+                if m is None:
+                    out.append(y)
+                else:
+                    stack.append((m, y))
+                    stack.append((x, m))
+        return out
+
+    def find_path(self, start_node, end_node):
+        if start_node == end_node:
+            return {'path': [start_node], 'total_time': 0}
+        if start_node not in self.up or end_node not in self.up:
+            return {'path': [], 'total_time': float('inf')}
+
+        dist = ({start_node: 0}, {end_node: 0})
+        parents = ({start_node: None}, {end_node: None})
+        heaps = ([(0, start_node)], [(0, end_node)])
+        best = float('inf')
+        meet = None
+
+        while True:
+            # a side is done once its smallest key can't beat the best meeting point
+            live = [side for side in (0, 1) if heaps[side] and heaps[side][0][0] < best]
+            if not live:
+                break
+            side = min(live, key=lambda sd: heaps[sd][0][0])
+            other = 1 - side
+
+            d, u = heapq.heappop(heaps[side])
+            if d > dist[side][u]:
+                continue  # stale entry
+
+            for v, cost in self.up[u].items():
+                nd = d + cost
+                if nd < dist[side].get(v, math.inf):
+                    dist[side][v] = nd
+                    parents[side][v] = u
+                    heapq.heappush(heaps[side], (nd, v))
+                    if v in dist[other] and nd + dist[other][v] < best:
+                        best = nd + dist[other][v]
+                        meet = v
+
+        if meet is None:
+            return {'path': [], 'total_time': float('inf')}
+
+        path = []
+        node = meet
+        while node is not None:
+            path.append(node)
+            node = parents[0][node]
+        path.reverse()
+        node = parents[1][meet]
+        while node is not None:
+            path.append(node)
+            node = parents[1][node]
+
+        return {'path': self._unpack(path), 'total_time': best}
@@ -0,0 +1,65 @@
+import heapq
+import math
+import numpy as np
+from app.models.flow_models import cheapest_per_target, SHORT_ROW
+
+def dijkstra_potentials(graph, source, potential, targets=(), min_capacity=1):
+    """
+    graph: ResidualGraph
+    potential: node potentials (array) that make every residual reduced cost
+               (cost + potential[u] - potential[v]) non-negative
+    targets: stop as soon as one of these nodes is settled (dist of unsettled nodes is then
+             only an upper bound). A target reached at the distance being settled is final
+             already, which saves popping all the zero reduced cost ties before it.
+    min_capacity: arcs with less residual capacity are skipped (capacities are whole buses)
+    returns: (dist, parent) with dist in reduced costs, parent[v] = position of the arc into v
+    """
+    graph.compile()
+    n = len(graph)
+    offsets, to, cap, cost = graph.offsets.tolist(), graph.to, graph.cap, graph.cost
+    dist = np.full(n, math.inf)
+    parent = np.full(n, -1, dtype=np.int64)
+    done = np.zeros(n, dtype=bool)
+
+    dist[source] = 0
+    heap = [(0.0, source)]
+
+    while heap:
+        d, u = heapq.heappop(heap)
+        if done[u]:
+            continue
+        done[u] = True
+        if u in targets:
+            break
+
+        lo, hi = offsets[u], offsets[u + 1]
+        du = d + potential[u]
+        if hi - lo <= SHORT_ROW:
+            for p, v, c, w in zip(range(lo, hi), to[lo:hi].tolist(), cap[lo:hi].tolist(), cost[lo:hi].tolist()):
+                if c >= min_capacity and not done[v]:
+                    nd = du + w - potential[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        parent[v] = p
+                        heapq.heappush(heap, (nd, v))
+                        if nd <= d and v in targets:
+                            return dist, parent
+            continue
+
+        # relax the whole row at once
+        vs = to[lo:hi]
+        nd = du + cost[lo:hi] - potential[vs]
+        idx = ((cap[lo:hi] >= min_capacity) & ~done[vs] & (nd < dist[vs])).nonzero()[0]
+        if not len(idx):
+            continue
+        if graph.parallel:
+            idx = cheapest_per_target(vs, nd, idx)
+        better = vs[idx]
+        dist[better] = nd[idx]
+        parent[better] = lo + idx
+        for item in zip(nd[idx].tolist(), better.tolist()):
+            heapq.heappush(heap, item)
+            if item[0] <= d and item[1] in targets:
+                return dist, parent
+
+    return dist, parent
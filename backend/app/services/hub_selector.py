@@ -1,8 +1,67 @@
+import heapq
+import math
+import random
 from app.services import AStarTransport
+from app.utils.process_pool import map_tasks
 
-def betweenness_centrality(G, astar, normalized=True, verbose = False):
-    nodes = list(G.nodes())
+# sources per shard; fixed so the merge order (and the float sums) don't depend on workers
+SHARD_SIZE = 32
+
+def _normalize(BC, n):
+    # same scale as the pairwise version: one unit per unordered (s, t) pair
+    if n <= 2:
+        return BC
+    scale = 1 / ((n - 1) * (n - 2) / 2)
+    for v in BC:
+        BC[v] *= scale
+    return BC
+
+def _compact_adjacency(nodes, graph):
+    # node i -> [(j, cost), ...]; small enough to ship to every worker once
+    index = {n: i for i, n in enumerate(nodes)}
+    return [[(index[w], cost) for w, cost in graph.get(n, {}).items()] for n in nodes]
+
+def _accumulate_source(adj, s, BC):
+    # one search tree from s to every target, counting all equal-cost shortest paths
+    S = []       # nodes in order of settling
+    P = {s: []}  # shortest path predecessors
+    sigma = {s: 1.0}
+    D = {}
+    seen = {s: 0}
+    heap = [(0, s, s)]
+
+    while heap:
+        dist, pred, v = heapq.heappop(heap)
+        if v in D:
+            continue  # stale entry
+        if v != s:
+            sigma[v] += sigma[pred]
+        S.append(v)
+        D[v] = dist
+
+        for w, cost in adj[v]:
+            vw_dist = dist + cost
+            if w not in D and (w not in seen or vw_dist < seen[w]):
+                seen[w] = vw_dist
+                heapq.heappush(heap, (vw_dist, v, w))
+                sigma[w] = 0.0
+                P[w] = [v]
+            elif vw_dist == seen[w]:
+                sigma[w] += sigma[v]
+                P[w].append(v)
 
+    # Brandes' accumulation, back to front
+    delta = dict.fromkeys(S, 0.0)
+    while S:
+        w = S.pop()
+        coeff = (1.0 + delta[w]) / sigma[w]
+        for v in P[w]:
+            delta[v] += sigma[v] * coeff
+        if w != s:
+            BC[w] += delta[w]
+    return BC
+
+def _pairwise_centrality(nodes, astar, verbose=False):
     iter = 0
     expected = len(nodes) * (len(nodes)-1)/2
     
@@ -31,10 +90,96 @@ def betweenness_centrality(G, astar, normalized=True, verbose = False):
             for v in intermediates:
                 BC[v] += 1
 
+    return BC
+
+def _accumulate_shard(adj, sources):
+    BC = [0.0] * len(adj)
+    for s in sources:
+        _accumulate_source(adj, s, BC)
+    return BC
+
+def _merge_shards(partials, n, n_shards, verbose=False):
+    # partials arrive in shard order, so the sums are the same for any worker count
+    total = [0.0] * n
+    for i, partial in enumerate(partials):
+        if verbose:
+            print("\x1b[2J\x1b[H", end='')
+            print(f"{int((i+1)*100/n_shards)}%\nShards: {i+1}\nFrom: {n_shards}")
+        for v, score in enumerate(partial):
+            total[v] += score
+    return total
+
+def _brandes_centrality(nodes, astar, verbose=False, workers=1, sources=None):
+    adj = _compact_adjacency(nodes, astar.graph)
+    if sources is None:
+        sources = range(len(nodes))
+    shards = [sources[i:i + SHARD_SIZE] for i in range(0, len(sources), SHARD_SIZE)]
+
+    partials = map_tasks(_accumulate_shard, adj, shards, workers=workers)
+    total = _merge_shards(partials, len(nodes), len(shards), verbose)
+
+    # every unordered pair was seen from both of its ends; a sample of k sources
+    # is scaled up by n / k to estimate the sum over all of them
+    scale = len(nodes) / len(sources) / 2 if len(sources) else 0
+    return {n: total[i] * scale for i, n in enumerate(nodes)}
+
+def samples_for_error(n, epsilon, delta=0.1):
+    # Hoeffding + union bound over the n nodes: with this many sampled sources every
+    # normalized score is within ~epsilon of the exact one with probability >= 1 - delta
+    if not 0 < epsilon < 1 or not 0 < delta < 1:
+        raise ValueError("epsilon and delta must be between 0 and 1")
+    return min(n, math.ceil(math.log(2 * n / delta) / (2 * epsilon ** 2)))
+
+def select_hubs(clusters, scores):
+    # the top-scoring node of every cluster: {pid: (score, node)}
+    hubs = {pid: (float('-inf'), None) for pid in clusters}
+    for pid, cluster in clusters.items():
+        for node in cluster:
+            score = scores[node]
+            if score > hubs[pid][0]:
+                hubs[pid] = (score, node)
+    return hubs
+
+def hub_agreement(clusters, exact, approx):
+    # how often the approximate scores pick the same hub as the exact ones
+    exact_hubs = select_hubs(clusters, exact)
+    approx_hubs = select_hubs(clusters, approx)
+    matches = sum(1 for pid in clusters if exact_hubs[pid][1] == approx_hubs[pid][1])
+    return {
+        'clusters': len(clusters),
+        'matches': matches,
+        'rate': matches / len(clusters) if clusters else 1.0,
+    }
+
+# mode="brandes" runs one search tree per source (n searches) and splits the credit
+# between equal-cost shortest paths; mode="pairwise" is the original one A* per pair.
+# workers > 1 shards the Brandes sources over a process pool (None = all cores).
+# samples=k (or a target error epsilon, see samples_for_error) only runs k random
+# sources and scales the result, which is enough to pick the hub of each cluster.
+def betweenness_centrality(G, astar, normalized=True, verbose = False, mode="brandes", workers=1,
+                           samples=None, epsilon=None, seed=None):
+    nodes = list(G.nodes())
+
+    if epsilon is not None and samples is None:
+        samples = samples_for_error(len(nodes), epsilon)
+
+    if samples is not None and mode != "brandes":
+        raise ValueError("Sampling is only supported by the brandes mode")
+
+    if mode == "brandes":
+        sources = None
+        if samples is not None and samples < len(nodes):
+            if samples < 1:
+                raise ValueError("samples must be at least 1")
+            sources = sorted(random.Random(seed).sample(range(len(nodes)), samples))
+        BC = _brandes_centrality(nodes, astar, verbose=verbose, workers=workers, sources=sources)
+    elif mode == "pairwise":
+        BC = _pairwise_centrality(nodes, astar, verbose=verbose)
+    else:
+        raise ValueError(f"Unknown centrality mode: {mode}")
+
     # normalization (optional)
     if normalized:
-        scale = 1 / ((len(nodes) - 1) * (len(nodes) - 2) / 2)
-        for v in BC:
-            BC[v] *= scale
+        _normalize(BC, len(nodes))
 
     return BC
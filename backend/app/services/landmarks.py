@@ -0,0 +1,82 @@
+import heapq
+import math
+import random
+import numpy as np
+import networkx as nx
+from app.models import CSRGraph
+
+def _adjacency(graph, weight="weight"):
+    if isinstance(graph, CSRGraph):
+        return graph.adjacency(weight)
+    if isinstance(graph, (nx.Graph, nx.DiGraph)):
+        return {n: {nbr: graph[n][nbr][weight] for nbr in graph.neighbors(n)} for n in graph.nodes}
+    return graph
+
+def _single_source(adj, s):
+    # distances from s to every reachable node
+    dist = {s: 0.0}
+    done = set()
+    heap = [(0.0, s)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for v, cost in adj.get(u, {}).items():
+            nd = d + cost
+            if nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return dist
+
+# ALT heuristic (A*, landmarks, triangle inequality): distances from a few landmarks are
+# precomputed once and |d(L, end) - d(L, n)| <= d(n, end) gives an admissible and
+# consistent lower bound for the metric the table was built on. It stays admissible on
+# any subgraph (masked views) and on graphs whose edges are paths of this one (the hub
+# graph). Meant for undirected graphs, like every map this app builds.
+class LandmarkHeuristic:
+    def __init__(self, graph, k=8, weight="weight", seed=None):
+        adj = _adjacency(graph, weight)
+        self.names = list(adj.keys())
+        index = {n: i for i, n in enumerate(self.names)}
+        k = min(k, len(self.names))
+
+        rng = random.Random(seed)
+        self.table = np.full((k, len(self.names)), np.inf)
+        self.landmarks = []
+        closest = np.full(len(self.names), np.inf)  # distance to the nearest chosen landmark
+
+        # farthest-point selection: every new landmark is the node worst covered so far
+        current = rng.choice(self.names) if self.names else None
+        for row in range(k):
+            self.landmarks.append(current)
+            for n, d in _single_source(adj, current).items():
+                self.table[row, index[n]] = d
+            closest = np.minimum(closest, self.table[row])
+            current = self.names[int(np.argmax(closest))]
+
+        self._vectors = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_vectors'] = None  # derived from the table
+        return state
+
+    def _node_vectors(self):
+        if self._vectors is None:
+            columns = self.table.T.tolist()
+            self._vectors = {n: columns[i] for i, n in enumerate(self.names)}
+        return self._vectors
+
+    def __call__(self, n, end):
+        vectors = self._node_vectors()
+        a, b = vectors.get(n), vectors.get(end)
+        if a is None or b is None:
+            return 0  # not covered by the table, fall back to no guidance
+        best = 0
+        for x, y in zip(a, b):
+            if x != math.inf and y != math.inf:
+                diff = x - y if x > y else y - x
+                if diff > best:
+                    best = diff
+        return best
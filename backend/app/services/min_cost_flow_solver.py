@@ -1,149 +1,374 @@
 import math
-from app.models.flow_models import FlowEdge
+import time
+import numpy as np
+from app.models.flow_models import ResidualGraph, INF_CAPACITY
 from app.services.spfa import spfa
-from app.utils.graph_distances import compute_garage_distances
+from app.services.dijkstra_potentials import dijkstra_potentials
+from app.utils.graph_distances import garage_endpoint_distances
 import networkx as nx
 
 
 def add_edge(graph, u, v, capacity, cost):
-    graph[u].append(FlowEdge(v, capacity, cost, len(graph[v])))
-    graph[v].append(FlowEdge(u, 0, -cost, len(graph[u]) - 1))
+    graph.add_edge(u, v, capacity, cost)
+
+
+def _augment(graph, parent, source, sink, limit=math.inf):
+    # push the path bottleneck (at most limit) along the parent pointers, returns (units, cost of the units)
+    to, cap, rev = graph.to, graph.cap, graph.rev
+    path = []
+    f = limit
+    v = sink
+    while v != source:
+        p = int(parent[v])
+        path.append(p)
+        f = min(f, int(cap[p]))
+        v = int(to[rev[p]])
+
+    path = np.array(path, dtype=np.int64)
+    cap[path] -= f
+    cap[rev[path]] += f
+    return f, f * float(graph.cost[path].sum())
+
+def _successive_spfa(graph, source, sink, demand):
+    # every augmenting path from a fresh SPFA (Bellman-Ford) run
+    flow, cost, augmentations = 0, 0, 0
+    while flow < demand:
+        dist, parent = spfa(graph, source)
+        if dist[sink] == math.inf:
+            raise Exception("Infeasible: not enough garage supply")
+        f, c = _augment(graph, parent, source, sink, limit=demand - flow)
+        flow += f
+        cost += c
+        augmentations += 1
+    graph.potential = _initial_potentials(graph, source)
+    return flow, cost, augmentations
+
+def _initial_potentials(graph, source):
+    dist, _ = spfa(graph, source)
+    return np.where(dist < math.inf, dist, 0.0)
+
+def _successive_dijkstra(graph, source, sink, demand):
+    # primal-dual: one SPFA for the initial potentials (0 when all costs are >= 0, like
+    # garage -> route distances), then Dijkstra on reduced costs for every augmentation.
+    # Each search stops once the sink is settled; adding min(dist, dist[sink]) to the
+    # potentials keeps all residual reduced costs >= 0.
+    potential = _initial_potentials(graph, source)
+
+    flow, cost, augmentations = 0, 0, 0
+    while flow < demand:
+        dist, parent = dijkstra_potentials(graph, source, potential, targets=(sink,))
+        reach = dist[sink]
+        if reach == math.inf:
+            raise Exception("Infeasible: not enough garage supply")
+        potential += np.minimum(dist, reach)
+        f, c = _augment(graph, parent, source, sink, limit=demand - flow)
+        flow += f
+        cost += c
+        augmentations += 1
+    graph.potential = potential
+    return flow, cost, augmentations
+
+def _scaling_phases(graph, potential, excess, delta):
+    # Capacity scaling phases delta, delta / 2, ..., 1 on a pseudo-flow with node imbalances
+    # (excess). A phase first saturates the residual arcs with at least delta capacity and a
+    # negative reduced cost, then moves at least delta units per augmentation from excess
+    # nodes to the nearest deficit. Updates the flow and potential in place.
+    # Returns (cost added, augmentations).
+    tails, to, cap, rev = graph.tails(), graph.to, graph.cap, graph.rev
+
+    cost, augmentations = 0, 0
+    while delta >= 1:
+        # arcs that just joined the delta-residual network may have negative reduced cost
+        reduced = graph.cost + potential[tails] - potential[to]
+        saturate = np.flatnonzero((cap >= delta) & (reduced < 0))
+        if len(saturate):
+            c = cap[saturate]
+            cap[saturate] = 0
+            cap[rev[saturate]] += c
+            np.subtract.at(excess, tails[saturate], c)
+            np.add.at(excess, to[saturate], c)
+            cost += float(c @ graph.cost[saturate])
+
+        deficits = set(np.flatnonzero(excess <= -delta).tolist())
+        for s in np.flatnonzero(excess >= delta).tolist():
+            while deficits and excess[s] >= delta:
+                dist, parent = dijkstra_potentials(graph, s, potential, targets=deficits, min_capacity=delta)
+                t = min(deficits, key=dist.__getitem__)
+                reach = dist[t]
+                if reach == math.inf:
+                    break  # no deficit reachable from s in this phase
+                potential += np.minimum(dist, reach)
+                f, c = _augment(graph, parent, s, t, limit=int(min(excess[s], -excess[t])))
+                excess[s] -= f
+                excess[t] += f
+                cost += c
+                augmentations += 1
+                if excess[t] > -delta:
+                    deficits.discard(t)
+        delta //= 2
+
+    if excess.any():
+        raise Exception("Infeasible: not enough garage supply")
+    return cost, augmentations
+
+def _settle_unbounded(graph, potential):
+    # Uncapacitated arcs can't be saturated: lower the potentials of their heads until their
+    # reduced costs are >= 0, every negative arc left is finite and the phases saturate it.
+    # Needed wherever the potentials aren't shortest distances, e.g. nodes the source doesn't
+    # reach (a garage without buses) keep potential 0.
+    tails, to, cost = graph.tails(), graph.to, graph.cost
+    unbounded = np.flatnonzero(graph.cap > INF_CAPACITY // 2)
+    for _ in range(len(graph)):
+        lowest = potential.copy()
+        np.minimum.at(lowest, to[unbounded], potential[tails[unbounded]] + cost[unbounded])
+        if np.array_equal(lowest, potential):
+            return potential
+        potential = lowest
+    raise Exception("Unbounded: negative cycle of uncapacitated arcs")
+
+def _capacity_scaling(graph, source, sink, demand):
+    # Capacity scaling: the phases run from the largest power of two <= demand, so there are
+    # log2(demand) of them and big bus counts no longer mean more augmentations. Node
+    # imbalances replace the single source: demand units at the source, -demand at the sink.
+    potential = _settle_unbounded(graph, _initial_potentials(graph, source))
+    excess = np.zeros(len(graph), dtype=np.int64)
+    excess[source] += demand
+    excess[sink] -= demand
+    _, augmentations = _scaling_phases(graph, potential, excess, 1 << max(int(demand).bit_length() - 1, 0))
+    graph.potential = potential
+    return demand, graph.flow_cost(), augmentations
+
+ENGINES = {
+    "spfa": _successive_spfa,
+    "dijkstra": _successive_dijkstra,
+    "scaling": _capacity_scaling,
+}
+
+def min_cost_flow(graph, source, sink, demand, engine="spfa", stats=None):
+    """
+    Sends demand units from source to sink in the ResidualGraph (built with add_edge).
+    engine: "spfa" (successive shortest paths, one SPFA per path, the original solver),
+            "dijkstra" (successive shortest paths with potentials) or "scaling" (capacity
+            scaling, for large bus counts)
+    stats: optional dict, filled with flow, cost, augmentations and time
+    Returns: (flow, cost)
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown min cost flow engine: {engine}")
+    started = time.perf_counter()
+    graph.compile()
+    flow, cost, augmentations = ENGINES[engine](graph, source, sink, demand)
+    if stats is not None:
+        stats.update({
+            'engine': engine,
+            'flow': flow,
+            'cost': cost,
+            'augmentations': augmentations,
+            'time': time.perf_counter() - started,
+        })
+    return flow, cost
+
+def reoptimize_min_cost_flow(graph, changes, stats=None):
+    """
+    Warm start: re-solves a solved ResidualGraph after cost changes on its uncapacitated arcs,
+    from the current flow and duals (graph.potential) instead of from zero flow.
+    changes: {arc position: new cost}; math.inf closes the arc (its flow has to find another
+             way), a finite cost on a closed arc opens it again
+    stats: optional dict, filled with changed, augmentations, cost and time
+    Returns: cost of the new flow
+    """
+    started = time.perf_counter()
+    n = len(graph)
+    tails, to, cap, rev, cost = graph.tails(), graph.to, graph.cap, graph.rev, graph.cost
+    potential = np.zeros(n) if graph.potential is None else graph.potential.copy()
+    excess = np.zeros(n, dtype=np.int64)
+
+    for p, c in changes.items():
+        q = rev[p]
+        if c == math.inf:
+            f = int(cap[q])
+            cap[p] = cap[q] = 0
+            excess[tails[p]] += f
+            excess[to[p]] -= f
+        else:
+            if cap[p] == 0 and cap[q] == 0:
+                cap[p] = INF_CAPACITY
+            cost[p] = c
+            cost[q] = -c
+
+    potential = _settle_unbounded(graph, potential)
+    negative = (cap > 0) & (cost + potential[tails] - potential[to] < 0)
+    bound = max(int(np.abs(excess).max(initial=0)), int(cap[negative].max(initial=0)))
+    _, augmentations = _scaling_phases(graph, potential, excess, 1 << max(bound.bit_length() - 1, 0))
+    graph.potential = potential
+
+    total = graph.flow_cost()
+    if stats is not None:
+        stats.update({
+            'changed': len(changes),
+            'augmentations': augmentations,
+            'cost': total,
+            'time': time.perf_counter() - started,
+        })
+    return total
+
+
+def _garage_route_costs(G, garage_nodes, routes, workers, stats):
+    # cheapest route endpoint per garage x route (inf if unreachable), and the station each
+    # route is supplied at (its endpoint nearest to the last garage that reaches it)
+    endpoints = list(dict.fromkeys(s for r in routes for s in (r.sequence[0], r.sequence[-1])))
+    column = {s: j for j, s in enumerate(endpoints)}
+    D = garage_endpoint_distances(G, garage_nodes, endpoints, workers=workers, stats=stats)
+    to_first = D[:, [column[r.sequence[0]] for r in routes]]
+    to_last = D[:, [column[r.sequence[-1]] for r in routes]]
+    at_first = to_first <= to_last
+    costs = np.where(at_first, to_first, to_last)
+
+    route_station = {}
+    for ri, r in enumerate(routes):
+        reached = np.flatnonzero(costs[:, ri] < math.inf)
+        if len(reached):
+            route_station[r.number] = r.sequence[0] if at_first[reached[-1], ri] else r.sequence[-1]
+    return costs, route_station
+
+def _garage_route_arcs(graph, n_garages, n_routes):
+    # arc position of every garage -> route pair
+    route_offset = 1 + n_garages
+    arcs = np.full((n_garages, n_routes), -1, dtype=np.int64)
+    for gi in range(n_garages):
+        row = graph.arcs(1 + gi)
+        heads = graph.to[row.start:row.stop].astype(np.int64) - route_offset
+        ok = (heads >= 0) & (heads < n_routes)
+        arcs[gi, heads[ok]] = row.start + np.flatnonzero(ok)
+    return arcs
+
+def _solution_graph(graph, arcs, garage_nodes, routes, route_station):
+    route_nodes = [r.number for r in routes]
+    route_supplied = {r.number: 0 for r in routes}
+    route_demand = {r.number: r.demand for r in routes}
+    flows = graph.cap[graph.rev[arcs]]
+
+    sol = nx.MultiGraph()
+
+    # add nodes
+    for g in garage_nodes:
+        sol.add_node(g, is_garage=True, label=g)
+
+    for gi, ri in zip(*np.nonzero(flows > 0)):
+        used = int(flows[gi, ri])
+        route_number = route_nodes[ri]
+        route_supplied[route_number] += used
+        sol.add_edge(
+            garage_nodes[gi],
+            route_number,
+            flow=used,
+            cost=float(graph.cost[arcs[gi, ri]]),
+            route=route_number
+        )
+
+    for r in route_nodes:
+        station = route_station.get(r)
+        supplied = route_supplied.get(r, 0)
+        demand = route_demand.get(r, 0)
+
+        label = f"R{r}\n{supplied}/{demand}"
+        if station:
+            label += f"\n{station}"
 
+        sol.add_node(r, is_route=True, label=label)
 
-def solve_min_cost_flow(G, R, routes_obj, garages_supply):
+        print(f"[Route {r}] supplied: {supplied}/{demand} at station {station}")
+
+    return sol
+
+
+def solve_min_cost_flow(G, R, routes_obj, garages_supply, engine="spfa", stats=None, workers=1, warm=None):
     """
+    engine / stats: see min_cost_flow, stats['distances'] gets the garage distance stats
+    workers: processes for the garage distance searches
+    warm: optional dict, filled with what resolve_min_cost_flow needs to start from this solution
     Returns: networkx.MultiGraph (solution graph)
     """
-    route_station = {}  # route_number -> station_name
-
-
     routes = routes_obj["obj"]
-    
-    route_supplied = {r.number: 0 for r in routes}
-    route_demand = {r.number: r.demand for r in routes}
 
     # --- index mapping ---
     garage_nodes = list(garages_supply.keys())
-    route_nodes = [r.number for r in routes]
 
     SRC = 0
     garage_offset = 1
     route_offset = garage_offset + len(garage_nodes)
-    SINK = route_offset + len(route_nodes)
+    SINK = route_offset + len(routes)
 
     N = SINK + 1
-    graph = [[] for _ in range(N)]
+    graph = ResidualGraph(N)
 
-    # --- distances ---
-    distances = compute_garage_distances(G, garage_nodes)
+    # --- distances (garage x route endpoint) ---
+    distance_stats = {}
+    costs, route_station = _garage_route_costs(G, garage_nodes, routes, workers, distance_stats)
 
     # --- source -> garages ---
     for i, g in enumerate(garage_nodes):
         add_edge(graph, SRC, garage_offset + i, garages_supply[g], 0)
 
     # --- routes -> sink ---
-    route_index = {r.number: idx for idx, r in enumerate(routes)}
-
-    for r in routes:
-        idx = route_index[r.number]
+    for idx, r in enumerate(routes):
         add_edge(graph, route_offset + idx, SINK, r.demand, 0)
 
     # --- garages -> routes ---
-    for gi, g in enumerate(garage_nodes):
-        dist_map = distances[g]
-
-        for r in routes:
-            idx = route_index[r.number]
-
-            # route endpoints
-            seq = r.sequence
-            u = seq[0]
-            v = seq[-1]
-
-            du = dist_map.get(u, math.inf)
-            dv = dist_map.get(v, math.inf)
-
-            if du <= dv:
-                cost = du
-                station = u
-            else:
-                cost = dv
-                station = v
-
+    # unreachable pairs get a closed arc (no capacity), which a warm re-solve can open
+    for gi in range(len(garage_nodes)):
+        for idx, cost in enumerate(costs[gi].tolist()):
             if cost < math.inf:
                 add_edge(graph, garage_offset + gi, route_offset + idx, math.inf, cost)
-
-                # remember which station THIS route is supplied at
-                route_station[r.number] = station
-
+            else:
+                add_edge(graph, garage_offset + gi, route_offset + idx, 0, 0)
 
     # --- min cost flow ---
-    flow = 0
-    cost = 0
-    total_demand = routes_obj["total_demand"]
-
-    while flow < total_demand:
-        dist, parent = spfa(graph, SRC)
-        if dist[SINK] == math.inf:
-            raise Exception("Infeasible: not enough garage supply")
-
-        # find bottleneck
-        f = math.inf
-        v = SINK
-        while v != SRC:
-            u, ei = parent[v]
-            f = min(f, graph[u][ei].capacity)
-            v = u
-
-        # apply flow
-        v = SINK
-        while v != SRC:
-            u, ei = parent[v]
-            e = graph[u][ei]
-            e.capacity -= f
-            graph[v][e.rev].capacity += f
-            cost += f * e.cost
-            v = u
-
-        flow += f
+    flow_stats = {} if stats is None else stats
+    min_cost_flow(graph, SRC, SINK, routes_obj["total_demand"], engine=engine, stats=flow_stats)
+    flow_stats['distances'] = distance_stats
+
+    arcs = _garage_route_arcs(graph, len(garage_nodes), len(routes))
+    if warm is not None:
+        warm.update({
+            'graph': graph,
+            'arcs': arcs,
+            'garages': garage_nodes,
+            'routes': list(routes),
+            'costs': costs,
+            'cold_augmentations': flow_stats['augmentations'],
+        })
 
     # --- build solution graph ---
-    sol = nx.MultiGraph()
-    
-    # add nodes
-    for g in garage_nodes:
-        sol.add_node(g, is_garage=True, label=g)
+    return _solution_graph(graph, arcs, garage_nodes, routes, route_station)
 
-    for gi, g in enumerate(garage_nodes):
-        u = garage_offset + gi
-        for e in graph[u]:
-            if route_offset <= e.to < route_offset + len(route_nodes):
-                used = graph[e.to][e.rev].capacity
-                if used > 0:
-                    r_idx = e.to - route_offset
-                    route_number = route_nodes[r_idx]
-                    
-                    route_supplied[route_number] += used
-
-                    sol.add_edge(
-                        g,
-                        route_number,
-                        flow=used,
-                        cost=e.cost,
-                        route=route_number
-                    )
-    for r in route_nodes:
-        station = route_station.get(r)
-        supplied = route_supplied.get(r, 0)
-        demand = route_demand.get(r, 0)
-
-        label = f"R{r}\n{supplied}/{demand}"
-        if station:
-            label += f"\n{station}"
-
-        sol.add_node(r, is_route=True, label=label)
-
-        print(f"[Route {r}] supplied: {supplied}/{demand} at station {station}")
-
-
-    return sol
+def resolve_min_cost_flow(G, routes_obj, warm, stats=None, workers=1):
+    """
+    Re-solves a fleet assignment after the map or the route endpoints changed, starting from
+    the solution in warm (filled by solve_min_cost_flow, kept up to date here). Only the
+    garage -> route arcs whose cost changed are repaired.
+    stats: optional dict, filled like reoptimize_min_cost_flow plus distances,
+           cold_augmentations (of the solve warm came from) and saved
+    Returns: networkx.MultiGraph (solution graph)
+    """
+    routes = routes_obj["obj"]
+    if [r.number for r in routes] != [r.number for r in warm['routes']]:
+        raise ValueError("The routes changed, the fleet needs a full solve")
+
+    distance_stats = {}
+    costs, route_station = _garage_route_costs(G, warm['garages'], routes, workers, distance_stats)
+    changed = np.flatnonzero(costs.ravel() != warm['costs'].ravel())
+    changes = dict(zip(warm['arcs'].ravel()[changed].tolist(), costs.ravel()[changed].tolist()))
+
+    flow_stats = {} if stats is None else stats
+    reoptimize_min_cost_flow(warm['graph'], changes, stats=flow_stats)
+    warm['costs'] = costs
+    warm['routes'] = list(routes)
+    flow_stats.update({
+        'engine': "warm",
+        'distances': distance_stats,
+        'cold_augmentations': warm['cold_augmentations'],
+        'saved': warm['cold_augmentations'] - flow_stats['augmentations'],
+    })
+
+    return _solution_graph(warm['graph'], warm['arcs'], warm['garages'], routes, route_station)
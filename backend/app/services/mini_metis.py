@@ -1,374 +1,485 @@
+import math
+import time
 import networkx as nx
+import numpy as np
 import random
 from collections import defaultdict
-from app.models import BucketQueue
+from app.models import GainBuckets, CSRGraph
+from app.utils.process_pool import map_tasks, resolve_workers
 
 # very small constant that we'll use
 EPS = 1e-9
 
+# an FM pass gives up after this many moves in a row without a better cut (at least 100)
+FM_STALL_FRACTION = 0.05
+
+# graphs smaller than this are split in-process even when workers > 1
+PARALLEL_MIN_NODES = 2000
+
 def ensure_undirected(G):
     return G.to_undirected() if G.is_directed() else G.copy()
 
-def preprocess_invert_edge_weights(G, cost_key="weight", sim_key="w", scale=1.0):
-    for u, v, data in G.edges(data=True):
-        cost = float(data.get(cost_key, 1.0))
-        if cost <= 0: 
-            cost = EPS
-        sim = 1.0 / cost
-        data[sim_key] = sim * scale
-
-def edge_sim(G, u, v, sim_key="w"):
-    return float(G[u][v].get(sim_key, 1.0))
-
-def heavy_edge_matching_coarsen(G, min_coarse_size=50, sim_key="w", seed=None):
-    if seed is not None:
-        random.seed(seed)
-
-    G = ensure_undirected(G)
-    nodes = list(G.nodes())
-    
-    # edge cases
-    if len(nodes) == 0:
-        return G.copy(), {}
-    if len(nodes) == 1:
-        mapping = {nodes[0]: 0}
-        Gc = nx.Graph()
-        Gc.add_node(0, members=[nodes[0]])
-        return Gc, mapping
-        
-    random.shuffle(nodes)
-    matched = set()
-    mapping = {}
-    super_id = 0
-
-    # try to match each node with its best unmatched neighbor for the first pass
-    for u in nodes:
-        if u in matched:
-            continue
+# One level of the multilevel scheme as flat arrays. Nodes are 0..n-1, the arcs of node i
+# (both directions of every edge) are offsets[i]:offsets[i+1] in targets / weights, and
+# vwgt counts the original nodes folded into each node.
+class Level:
+    def __init__(self, offsets, targets, weights, vwgt):
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.vwgt = vwgt
+        self.n = len(vwgt)
+        self._lists = None
 
-        best_v = None
-        best_sim = -1.0
-        for v in G.neighbors(u):
-            if v not in matched and v != u:
-                s = edge_sim(G, u, v, sim_key)
-                if s > best_sim:
-                    best_sim = s
-                    best_v = v
-
-        if best_v is not None:
-            mapping[u] = super_id
-            mapping[best_v] = super_id
-            matched.add(u)
-            matched.add(best_v)
-            super_id += 1
-        else:
-            mapping[u] = super_id
-            matched.add(u)
-            super_id += 1
-
-        # stop when we reach target coarse size
-        if super_id >= min_coarse_size:
-            break
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_lists'] = None  # derived, rebuilt on demand
+        return state
 
-    # handle any remaining unmatched nodes
-    for node in nodes:
-        if node not in mapping:
-            mapping[node] = super_id
-            super_id += 1
-
-    # build coarse graph
-    Gc = nx.Graph()
-    members = defaultdict(list)
-    for n, s in mapping.items():
-        members[s].append(n)
-    
-    for s, mem_list in members.items():
-        Gc.add_node(s, members=mem_list)
-
-    edge_dict = defaultdict(float)
-    for u, v, data in G.edges(data=True):
-        su = mapping[u]
-        sv = mapping[v]
-        if su == sv:
-            continue
-        key = (min(su, sv), max(su, sv))
-        edge_dict[key] += float(data.get(sim_key, 1.0))
+    @classmethod
+    def from_arcs(cls, n, src, dst, weights, vwgt=None):
+        keep = src != dst  # self loops never change a cut
+        src, dst, weights = src[keep], dst[keep], weights[keep]
+        order = np.lexsort((dst, src))
+        offsets = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+        if vwgt is None:
+            vwgt = np.ones(n, dtype=np.int64)
+        return cls(offsets, dst[order], weights[order], vwgt)
 
-    for (su, sv), w in edge_dict.items():
-        Gc.add_edge(su, sv, w=w)
+    def lists(self):
+        # plain lists for the per-node python loops, made once per level
+        if self._lists is None:
+            self._lists = (self.offsets.tolist(), self.targets.tolist(), self.weights.tolist(), self.vwgt.tolist())
+        return self._lists
 
-    return Gc, mapping
+    def subgraph(self, nodes):
+        # the level restricted to nodes (sorted node ids), renumbered 0..len(nodes)-1
+        nodes = np.asarray(nodes, dtype=np.int64)
+        local = np.full(self.n, -1, dtype=np.int64)
+        local[nodes] = np.arange(len(nodes))
+        starts = self.offsets[nodes]
+        counts = self.offsets[nodes + 1] - starts
+        src = np.repeat(np.arange(len(nodes)), counts)
+        pos = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        dst = local[self.targets[pos]]
+        keep = dst >= 0
+        offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src[keep], minlength=len(nodes)), out=offsets[1:])
+        return Level(offsets, dst[keep], self.weights[pos][keep], self.vwgt[nodes])
 
-def greedy_initial_bisection(G, sim_key="w"):
-    nodes = list(G.nodes())
-    
-    if len(nodes) == 0:
-        return {}
-    if len(nodes) == 1:
-        return {nodes[0]: 0}
-    
-    # more connected nodes first
-    deg_dict = {}
-    for node in nodes:
-        deg = 0.0
-        for neighbor in G.neighbors(node):
-            deg += G[node][neighbor].get(sim_key, 1.0)
-        deg_dict[node] = deg
-    
-    nodes_sorted = sorted(nodes, key=lambda x: deg_dict[x], reverse=True)
-    
-    part = {}
-    count_0, count_1 = 0, 0
-    target = len(nodes) / 2
-    
-    for node in nodes_sorted:
-        if count_0 <= count_1 and count_0 < target:
-            part[node] = 0
-            count_0 += 1
-        else:
-            part[node] = 1
-            count_1 += 1
-            
-    return part
+def similarity_level(G_in, cost_key="weight", scale=1.0):
+    # (node names, Level) with similarity = scale / cost on every edge, so cheap edges are
+    # the ones worth keeping inside a part
+    if isinstance(G_in, CSRGraph) and not G_in.is_directed():
+        names = G_in.nodes()
+        local = np.full(len(G_in.names), -1, dtype=np.int64)
+        local[[G_in.index[n] for n in names]] = np.arange(len(names))
+        src, dst, pos = G_in.arcs()
+        src, dst, cost = local[src], local[dst], getattr(G_in, cost_key)[pos]
+    else:
+        if isinstance(G_in, CSRGraph):
+            G_in = G_in.to_networkx(attrs=(cost_key,))
+        G = ensure_undirected(G_in)
+        names = list(G.nodes())
+        index = {n: i for i, n in enumerate(names)}
+        ends, cost = [], []
+        for u, v, data in G.edges(data=True):
+            c = float(data.get(cost_key, 1.0))
+            ends += [(index[u], index[v]), (index[v], index[u])]
+            cost += [c, c]
+        ends = np.array(ends, dtype=np.int64).reshape(-1, 2)
+        src, dst, cost = ends[:, 0], ends[:, 1], np.array(cost, dtype=np.float64)
 
-def cut_size(G, part, sim_key="w"):
+    cost = np.where(cost <= 0, EPS, cost)
+    return names, Level.from_arcs(len(names), src, dst, scale / cost)
+
+# rng: anything with shuffle / randrange (the random module or a random.Random)
+def heavy_edge_matching_coarsen(level, rng=random):
+    # every node is matched with its heaviest unmatched neighbour (random visiting order)
+    off, tgt, w, _ = level.lists()
+    order = list(range(level.n))
+    rng.shuffle(order)
+
+    cmap = [-1] * level.n
+    nc = 0
+    for u in order:
+        if cmap[u] != -1:
+            continue
+        best, best_sim = u, -1.0
+        for p in range(off[u], off[u + 1]):
+            v = tgt[p]
+            if cmap[v] == -1 and w[p] > best_sim:
+                best, best_sim = v, w[p]
+        cmap[u] = cmap[best] = nc
+        nc += 1
+
+    # coarse arcs: parallel arcs between the same two super nodes are summed
+    cmap = np.array(cmap, dtype=np.int64)
+    src = cmap[np.repeat(np.arange(level.n), np.diff(level.offsets))]
+    dst = cmap[level.targets]
+    keep = src != dst
+    keys, inverse = np.unique(src[keep] * nc + dst[keep], return_inverse=True)
+    weights = np.bincount(inverse, weights=level.weights[keep])
+    vwgt = np.bincount(cmap, weights=level.vwgt, minlength=nc).astype(np.int64)
+    return Level.from_arcs(nc, keys // nc, keys % nc, weights, vwgt), cmap
+
+def cut_size(level, part):
+    off, tgt, w, _ = level.lists()
     cut = 0.0
-    for u, v, data in G.edges(data=True):
-        if part.get(u) != part.get(v):
-            cut += data.get(sim_key, 1.0)
-    return cut
+    for u in range(level.n):
+        for p in range(off[u], off[u + 1]):
+            if part[u] != part[tgt[p]]:
+                cut += w[p]
+    return cut / 2
+
+class _Bisection:
+    # part + gains + part weights of one level, updated incrementally as nodes move.
+    # gain[v] = (weight to the other part) - (weight to its own part) = how much the cut
+    # drops if v moves; moving v changes only its neighbours' gains, by 2 * edge weight.
+    def __init__(self, level, part, fraction, balance_tol):
+        self.level = level
+        off, tgt, w, vw = level.lists()
+        self.part = list(part)
+        total = sum(vw)
+        # heavy coarse nodes can't always land exactly on target, so allow one of them extra
+        slack = max(vw) - 1 if vw else 0
+        self.target = (total * fraction, total * (1 - fraction))
+        self.max_weight = tuple(t * (1 + balance_tol) + slack for t in self.target)
+        self.weight = [0, 0]
+        for v in range(level.n):
+            self.weight[self.part[v]] += vw[v]
+
+        self.gain = [0.0] * level.n
+        cut = 0.0
+        for u in range(level.n):
+            g = 0.0
+            for p in range(off[u], off[u + 1]):
+                if self.part[tgt[p]] != self.part[u]:
+                    g += w[p]
+                    cut += w[p]
+                else:
+                    g -= w[p]
+            self.gain[u] = g
+        self.cut = cut / 2
 
-# Fiduccia–Mattheyses refinement with efficient bucket queues.
+    def violation(self):
+        return max(0, self.weight[0] - self.max_weight[0]) + max(0, self.weight[1] - self.max_weight[1])
+
+    def feasible(self, v):
+        a = self.part[v]
+        b = 1 - a
+        vw = self.level.lists()[3][v]
+        if self.weight[b] + vw <= self.max_weight[b]:
+            return True
+        # out of balance: still fine if it brings the parts closer to their targets
+        return self.weight[a] > self.max_weight[a] and \
+            self.weight[b] + vw - self.target[b] < self.weight[a] - self.target[a]
+
+    def move(self, v, queues=None, locked=None):
+        off, tgt, w, vw = self.level.lists()
+        part, gain = self.part, self.gain
+        a = part[v]
+        part[v] = 1 - a
+        self.weight[a] -= vw[v]
+        self.weight[1 - a] += vw[v]
+        self.cut -= gain[v]
+        gain[v] = -gain[v]
+        for p in range(off[v], off[v + 1]):
+            u = tgt[p]
+            old = gain[u]
+            gain[u] = old + 2 * w[p] if part[u] == a else old - 2 * w[p]
+            if queues is not None and not locked[u]:
+                queue = queues[part[u]]
+                queue.remove(old, u)
+                queue.insert(gain[u], u)
+
+# Fiduccia–Mattheyses refinement with gain buckets; gains are kept up to date by edge weight
+# as nodes move, and a pass rolls back to its best prefix instead of copying the partition.
+# fraction: wanted share of the total node weight in part 0
 # balance_tol is tolerated fraction (e.g., 0.03 => +-3%).
-def fm_bisection_refine(G, part, sim_key="w", max_passes=10, balance_tol=0.03):
-    N = G.number_of_nodes()
-    if N == 0:
-        return part
-        
-    ideal = N / 2.0
-    min_allowed = max(1, int((1.0 - balance_tol) * ideal))  # ensure at least 1 node per part
-    max_allowed = min(N-1, int((1.0 + balance_tol) * ideal))  # ensure at least 1 node per part
-    
-    gains = {}
-    buckets_0 = BucketQueue()
-    buckets_1 = BucketQueue()
-    
-    def compute_gain(node, current_partition):
-        p = current_partition[node]
-        external, internal = 0.0, 0.0
-        for neighbor in G.neighbors(node):
-            w = float(G[node][neighbor].get(sim_key, 1.0))
-            if current_partition[neighbor] == p:
-                internal += w
-            else:
-                external += w
-        return external - internal
-    
-    # initialize all gains
-    for node in G.nodes():
-        gain = compute_gain(node, part)
-        gains[node] = gain
-        if part[node] == 0:
-            buckets_0.insert(gain, node)
-        else:
-            buckets_1.insert(gain, node)
-    
-    locked = set()
-    best_part = part.copy()
-    best_cut = cut_size(G, part, sim_key)
-    
+# buckets: gain bucket factory (default: GainBuckets sized to the largest weighted degree)
+def fm_bisection_refine(level, part, fraction=0.5, max_passes=10, balance_tol=0.03, buckets=None):
+    if level.n <= 1:
+        return list(part)
+
+    state = _Bisection(level, part, fraction, balance_tol)
+    if buckets is None:
+        off, _, w, _ = level.lists()
+        bound = max(sum(w[off[v]:off[v + 1]]) for v in range(level.n))
+        buckets = lambda: GainBuckets.for_bound(bound, level.n)
+    stall_limit = min(level.n, max(100, int(level.n * FM_STALL_FRACTION)))
+
     for pass_num in range(max_passes):
-        current_part = part.copy()
-        current_cut = best_cut
-        count_0 = sum(1 for n in G.nodes() if current_part[n] == 0)
-        count_1 = N - count_0
-        
-        # create temporary bucket queues for this pass
-        temp_buckets_0 = BucketQueue()
-        temp_buckets_1 = BucketQueue()
-        for node in G.nodes():
-            if current_part[node] == 0:
-                temp_buckets_0.insert(gains[node], node)
-            else:
-                temp_buckets_1.insert(gains[node], node)
-        
-        move_sequence = []
-        improved = False
-        
-        # try to move N nodes (one pass)
-        for move_idx in range(N):
-            # find best movable node
-            candidate = None
-            from_part = None
-            
-            # part 0 -> part 1
-            while not temp_buckets_0.is_empty() and candidate is None:
-                gain, node = temp_buckets_0.pop_max()
-                if node in locked:
-                    continue
-                if count_0 - 1 >= min_allowed and count_1 + 1 <= max_allowed:
-                    candidate = node
-                    from_part = 0
-                else:
-                    temp_buckets_0.insert(gain, node)
-                    break
-            
-            while not temp_buckets_1.is_empty() and candidate is None:
-                gain, node = temp_buckets_1.pop_max()
-                if node in locked:
-                    continue
-                if count_1 - 1 >= min_allowed and count_0 + 1 <= max_allowed:
-                    candidate = node
-                    from_part = 1
-                else:
-                    temp_buckets_1.insert(gain, node)
-                    break
-            
-            if candidate is None:
-                break  # no valid moves remain
-                
-            old_part = from_part
-            new_part = 1 - old_part
-            move_gain = gains[candidate]
-            
-            current_part[candidate] = new_part
-            locked.add(candidate)
-            move_sequence.append((candidate, old_part, new_part, move_gain))
-            
-            if old_part == 0:
-                count_0 -= 1
-                count_1 += 1
-            else:
-                count_1 -= 1
-                count_0 += 1
-                
-            current_cut -= move_gain
-            
-            for neighbor in G.neighbors(candidate):
-                if neighbor in locked:
-                    continue
-                    
-                old_gain = gains[neighbor]
-                new_gain = compute_gain(neighbor, current_part)
-                gains[neighbor] = new_gain
-                
-                if current_part[neighbor] == 0:
-                    temp_buckets_0.remove(old_gain, neighbor)
-                    temp_buckets_0.insert(new_gain, neighbor)
-                else:
-                    temp_buckets_1.remove(old_gain, neighbor)
-                    temp_buckets_1.insert(new_gain, neighbor)
-            
-            if current_cut < best_cut:
-                best_cut = current_cut
-                best_part = current_part.copy()
-                improved = True
-        
-        if not improved and pass_num > 0:
+        queues = (buckets(), buckets())
+        for v in range(level.n):
+            queues[state.part[v]].insert(state.gain[v], v)
+        locked = [False] * level.n
+
+        moves = []
+        best = (state.violation(), state.cut)
+        best_len = 0
+        while len(moves) - best_len < stall_limit:
+            # best feasible node on each side; an infeasible top blocks its side for this move
+            candidates = []
+            for side in (0, 1):
+                if not queues[side].is_empty():
+                    gain, v = queues[side].pop_max()
+                    candidates.append((gain, state.weight[side], v, state.feasible(v)))
+            moving = max((c for c in candidates if c[3]), default=None)
+            for c in candidates:
+                if c is not moving:
+                    queues[state.part[c[2]]].insert(c[0], c[2])
+            if moving is None:
+                break
+
+            v = moving[2]
+            locked[v] = True
+            state.move(v, queues, locked)
+            moves.append(v)
+            current = (state.violation(), state.cut)
+            if current < best:
+                best = current
+                best_len = len(moves)
+
+        # back to the best point of the pass
+        for v in reversed(moves[best_len:]):
+            state.move(v)
+        if best_len == 0:
             break
-            
-        part = best_part.copy()
-        locked.clear()
-        
-        for node in G.nodes():
-            gains[node] = compute_gain(node, part)
-            
-    return best_part
-
-def project_partition(fine_nodes, coarse_map, coarse_part):
-    part = {}
-    for n in fine_nodes:
-        c = coarse_map[n]
-        part[n] = coarse_part.get(c, 0)  # Default to 0 if not found
-    return part
+
+    return state.part
+
+def initial_bisection(level, fraction=0.5, balance_tol=0.03, tries=4, rng=random):
+    # grow part 0 breadth first from a random node until it holds its share, refine, keep the best
+    off, tgt, _, vw = level.lists()
+    goal = sum(vw) * fraction
+    best = None
+    for _ in range(tries):
+        part = [1] * level.n
+        grown = 0
+        queue = [rng.randrange(level.n)]
+        seen = {queue[0]}
+        unseen = iter(range(level.n))
+        head = 0
+        while grown < goal:
+            if head == len(queue):
+                # disconnected graph: carry on from any node not reached yet
+                v = next(u for u in unseen if u not in seen)
+                seen.add(v)
+                queue.append(v)
+            v = queue[head]
+            head += 1
+            part[v] = 0
+            grown += vw[v]
+            for p in range(off[v], off[v + 1]):
+                if tgt[p] not in seen:
+                    seen.add(tgt[p])
+                    queue.append(tgt[p])
+
+        part = fm_bisection_refine(level, part, fraction, balance_tol=balance_tol)
+        state = _Bisection(level, part, fraction, balance_tol)
+        score = (state.violation(), state.cut)
+        if best is None or score < best[0]:
+            best = (score, part)
+    return best[1]
+
+def project_partition(cmap, coarse_part):
+    return np.asarray(coarse_part)[cmap].tolist()
 
 # Multilevel bisection using coarsening and refinement.
-def multilevel_bisection(G_orig, sim_key="w", max_levels=20, min_coarse_size=20, balance_tol=0.03):
-    G0 = ensure_undirected(G_orig)
-    
+def multilevel_bisection(level, fraction=0.5, max_levels=40, min_coarse_size=20, balance_tol=0.03, rng=random):
     # handle trivial edge cases
-    if G0.number_of_nodes() <= 1:
-        return {node: 0 for node in G0.nodes()}
-    
-    graphs = [G0]
-    mappings = []
-    
-    current_G = G0
-    while current_G.number_of_nodes() > min_coarse_size and len(graphs) < max_levels:
-        Gc, mapping = heavy_edge_matching_coarsen(current_G, min_coarse_size=min_coarse_size, sim_key=sim_key)
-        
-        if Gc.number_of_nodes() >= current_G.number_of_nodes() * 0.8:
+    if level.n <= 1:
+        return [0] * level.n
+
+    levels = [level]
+    cmaps = []
+    while levels[-1].n > min_coarse_size and len(levels) < max_levels:
+        coarse, cmap = heavy_edge_matching_coarsen(levels[-1], rng=rng)
+        if coarse.n >= levels[-1].n * 0.8:
             break
-            
-        graphs.append(Gc)
-        mappings.append(mapping)
-        current_G = Gc
+        levels.append(coarse)
+        cmaps.append(cmap)
 
-    G_coarsest = graphs[-1]
-    coarse_part = greedy_initial_bisection(G_coarsest, sim_key)
-    coarse_part = fm_bisection_refine(G_coarsest, coarse_part, sim_key=sim_key, balance_tol=balance_tol)
+    part = initial_bisection(levels[-1], fraction, balance_tol, rng=rng)
 
     # uncoarsen and refine
-    part = coarse_part
-    for level in range(len(mappings)-1, -1, -1):
-        # project to finer level
-        part = project_partition(graphs[level].nodes(), mappings[level], part)
-        # refine at this level
-        part = fm_bisection_refine(graphs[level], part, sim_key=sim_key, balance_tol=balance_tol)
-    
+    for i in range(len(cmaps) - 1, -1, -1):
+        part = project_partition(cmaps[i], part)
+        part = fm_bisection_refine(levels[i], part, fraction, balance_tol=balance_tol)
+
+    # both sides need at least one node
+    if 0 not in part or 1 not in part:
+        part[0] = 1 - part[0]
     return part
 
-def recursive_k_partition(G, k, sim_key="w", balance_tol=0.03):
+def _split_step(level, nodes, parts_to_make, offset, parent_balance_tol, seed):
+    # one node of the bisection tree: ([(nodes, part ids)] leaves, [child tasks]).
+    # Its randomness comes from (seed, offset, parts_to_make) only, so a subtree splits the
+    # same way whichever process runs it.
+    if len(nodes) == 0:
+        return [], []
+    if parts_to_make == 1:
+        return [(nodes, offset)], []
+    if len(nodes) <= parts_to_make:
+        return [(nodes, offset + np.arange(len(nodes)))], []
+
+    current_balance_tol = min(0.5, parent_balance_tol * 1.1)  # Cap at 50%
+    left_parts = parts_to_make // 2
+    right_parts = parts_to_make - left_parts
+
+    # an odd split (e.g. 3 = 1 + 2) gets the matching share of the nodes on each side
+    rng = random.Random(f"{seed}:{offset}:{parts_to_make}")
+    bis_part = np.array(multilevel_bisection(level.subgraph(nodes), fraction=left_parts / parts_to_make,
+                                             balance_tol=current_balance_tol, rng=rng))
+    return [], [(nodes[bis_part == 0], left_parts, offset, current_balance_tol),
+                (nodes[bis_part == 1], right_parts, offset + left_parts, current_balance_tol)]
+
+def _split_subtree(level, task, seed):
+    leaves = []
+    stack = [task]
+    while stack:
+        done, children = _split_step(level, *stack.pop(), seed)
+        leaves += done
+        stack += children
+    return leaves
+
+def _subtree_task(level_seed, task):
+    level, seed = level_seed
+    return _split_subtree(level, task, seed)
+
+# workers > 1 splits the top of the bisection tree here and hands the independent subtrees
+# to a process pool (None = all cores); the result is the same for any worker count.
+# seed: fixes the random choices (default: drawn from the random module)
+def recursive_k_partition(level, k, balance_tol=0.03, workers=1, seed=None):
+    # part id per node; the splits work on index subsets of the flat arrays, nothing is copied
+    assign = np.zeros(level.n, dtype=np.int64)
     if k <= 1:
-        return {n: 0 for n in G.nodes()}
-    
+        return assign.tolist()
+
     # handle case where k > number of nodes
-    if k > G.number_of_nodes():
-        k = G.number_of_nodes()
-    
-    def split_subgraph(node_list, parts_to_make, offset, parent_balance_tol):
-        if len(node_list) == 0:
-            return {}
-            
-        if parts_to_make == 1:
-            return {n: offset for n in node_list}
-            
-        subG = G.subgraph(node_list).copy()
-        
-        current_balance_tol = min(0.5, parent_balance_tol * 1.1)  # Cap at 50%
-        
-        bis_part = multilevel_bisection(subG, sim_key=sim_key, balance_tol=current_balance_tol)
-        
-        left_nodes = [n for n, p in bis_part.items() if p == 0]
-        right_nodes = [n for n, p in bis_part.items() if p == 1]
-        
-        left_parts = parts_to_make // 2
-        right_parts = parts_to_make - left_parts
-        
-        left_assign = split_subgraph(left_nodes, left_parts, offset, current_balance_tol)
-        right_assign = split_subgraph(right_nodes, right_parts, offset + left_parts, current_balance_tol)
-        
-        left_assign.update(right_assign)
-        return left_assign
-    
-    return split_subgraph(list(G.nodes()), k, 0, balance_tol)
+    k = min(k, level.n)
+    if seed is None:
+        seed = random.getrandbits(32)
+    workers = resolve_workers(workers)
+
+    root = (np.arange(level.n), k, 0, balance_tol)
+    if workers > 1 and level.n >= PARALLEL_MIN_NODES:
+        leaves, tasks = [], [root]
+        while tasks and len(tasks) < 2 * workers:
+            children = []
+            for task in tasks:
+                done, more = _split_step(level, *task, seed)
+                leaves += done
+                children += more
+            tasks = children
+        for done in map_tasks(_subtree_task, (level, seed), tasks, workers=workers):
+            leaves += done
+    else:
+        leaves = _split_subtree(level, root, seed)
+
+    for nodes, ids in leaves:
+        assign[nodes] = ids
+    return assign.tolist()
+
+# Greedy k-way refinement over the final parts: boundary nodes move to the neighbouring part
+# they are most connected to when that lowers the cut (or keeps it and evens out the sizes),
+# and nodes of parts above the size limit move to the best neighbouring part with room.
+# No move takes a part above total / k * (1 + balance_tol) (rounded up) or below
+# total / k * (1 - balance_tol) (rounded down). Returns the number of moves.
+def kway_refine(level, assign, k, balance_tol=0.03, max_passes=8):
+    off, tgt, w, vw = level.lists()
+    weight = [0] * k
+    for v in range(level.n):
+        weight[assign[v]] += vw[v]
+    ideal = sum(vw) / k
+    limit = max(ideal * (1 + balance_tol), math.ceil(ideal))
+    floor = max(math.floor(ideal * (1 - balance_tol)), 1)  # parts become routes, keep them from draining
+
+    moves = 0
+    for pass_num in range(max_passes):
+        moved = 0
+        for v in range(level.n):
+            a = assign[v]
+            if weight[a] - vw[v] < floor:
+                continue  # never take a part under the lower size limit
+            conn = {}
+            for p in range(off[v], off[v + 1]):
+                b = assign[tgt[p]]
+                conn[b] = conn.get(b, 0.0) + w[p]
+            internal = conn.pop(a, 0.0)
+            if not conn:
+                continue  # not on a boundary
+
+            over = weight[a] > limit
+            best = None
+            for b, external in conn.items():
+                # a part over the limit may also pass nodes to a lighter neighbour that is full,
+                # which then passes them on: the excess spreads out over the passes
+                if weight[b] + vw[v] > limit and not (over and weight[b] + vw[v] < weight[a]):
+                    continue
+                gain = external - internal
+                if gain > 0 or over or (gain == 0 and weight[b] + vw[v] < weight[a]):
+                    key = (gain, -weight[b])
+                    if best is None or key > best[0]:
+                        best = (key, b)
+            if best is None:
+                continue
+
+            b = best[1]
+            assign[v] = b
+            weight[a] -= vw[v]
+            weight[b] += vw[v]
+            moved += 1
+        moves += moved
+        if not moved:
+            break
+    return moves
 
 # public api
-def metis_partition(G_in, k=4, balance_tol=0.03, cost_key="weight", sim_key="w", scale=1.0):
+# sim_key is no longer used (similarities live in the level arrays, not on the graph)
+# refine: run the k-way refinement over the final parts after the recursive bisection
+# workers: processes for independent bisection subtrees (see recursive_k_partition)
+# stats: optional dict, filled with the edge cut, balance (largest part / ideal), smallest (smallest part / ideal),
+#        time and k-way moves
+def metis_partition(G_in, k=4, balance_tol=0.03, cost_key="weight", sim_key="w", scale=1.0,
+                    refine=True, workers=1, stats=None):
     if k < 1:
         raise ValueError("k must be at least 1")
-        
-    G = ensure_undirected(G_in).copy()
-    
+
+    started = time.perf_counter()
+    names, level = similarity_level(G_in, cost_key=cost_key, scale=scale)
+
     # handle empty graph
-    if G.number_of_nodes() == 0:
+    if level.n == 0:
         return {}, {}
-    
-    preprocess_invert_edge_weights(G, cost_key=cost_key, sim_key=sim_key, scale=scale)
-    parts = recursive_k_partition(G, k, sim_key=sim_key, balance_tol=balance_tol)
+
+    ids = recursive_k_partition(level, k, balance_tol=balance_tol, workers=workers)
+    moves = kway_refine(level, ids, max(ids) + 1, balance_tol=balance_tol) if refine and k > 1 else 0
+
+    return partition_result(names, level, ids, started, stats, kway_moves=moves)
+
+def partition_result(names, level, ids, started, stats=None, **extra):
+    # (parts, clusters) from part ids per level node; fills stats like metis_partition does
+    parts = {n: pid for n, pid in zip(names, ids)}
     clusters = defaultdict(list)
     for n, pid in parts.items():
         clusters[pid].append(n)
+
+    if stats is not None:
+        vw = level.lists()[3]
+        sizes = defaultdict(int)
+        for v, pid in enumerate(ids):
+            sizes[pid] += vw[v]
+        stats.update({
+            'parts': len(clusters),
+            'cut': cut_size(level, ids),
+            'balance': max(sizes.values()) / (sum(vw) / len(sizes)),
+            'smallest': min(sizes.values()) / (sum(vw) / len(sizes)),
+            **extra,
+            'time': time.perf_counter() - started,
+        })
     return parts, dict(clusters)
 
 if __name__ == "__main__":
@@ -381,13 +492,14 @@ if __name__ == "__main__":
             traffic = random.uniform(1.0, 10.0)
             cost = distance / (traffic ** 0.5)
             G[u][v]['weight'] = cost
-            
+
         parts, clusters = metis_partition(G, k=4, balance_tol=0.05)
+        names, level = similarity_level(G)
         print("Cluster sizes:", {pid: len(nodes) for pid, nodes in clusters.items()})
-        print("Total cut size:", cut_size(G, parts, sim_key="w"))
+        print("Total cut size:", cut_size(level, [parts[n] for n in names]))
         print(clusters)
         print(parts)
-        
+
         # verify all nodes are assigned
         all_assigned = len(parts) == G.number_of_nodes()
-        print(f"All nodes assigned: {all_assigned}")
\ No newline at end of file
+        print(f"All nodes assigned: {all_assigned}")
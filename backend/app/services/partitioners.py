@@ -0,0 +1,143 @@
+import time
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import laplacian
+from scipy.sparse.linalg import eigsh, ArpackNoConvergence
+from app.services.mini_metis import (metis_partition, similarity_level, fm_bisection_refine, kway_refine,
+                                     partition_result)
+
+# Every partitioner has the metis_partition signature (minus sim_key) and returns
+# (parts, clusters); options a backend has no use for are ignored. A backend whose library
+# isn't there raises ImportError and partition_graph moves on to the next one.
+
+# subgraphs up to this size get their Fiedler vector from a dense eigensolver
+DENSE_EIGEN_LIMIT = 400
+
+def metis_binding_partition(G_in, k=4, balance_tol=0.03, cost_key="weight", scale=1.0,
+                            refine=True, workers=1, stats=None):
+    # the METIS library through the `metis` package (needs libmetis, see METIS_DLL)
+    try:
+        import metis
+    except (ImportError, RuntimeError, OSError) as e:
+        raise ImportError(f"metis binding unavailable: {e}") from e
+    if k < 1:
+        raise ValueError("k must be at least 1")
+
+    started = time.perf_counter()
+    names, level = similarity_level(G_in, cost_key=cost_key, scale=scale)
+    if level.n == 0:
+        return {}, {}
+
+    if k == 1:
+        ids = [0] * level.n
+    else:
+        # METIS wants integer edge weights: similarities rescaled to 1..1000
+        off, tgt, w, _ = level.lists()
+        top = max(w) if w else 1.0
+        adjlist = [[(tgt[p], max(1, round(1000 * w[p] / top))) for p in range(off[v], off[v + 1])]
+                   for v in range(level.n)]
+        _, ids = metis.part_graph(metis.adjlist_to_metis(adjlist), nparts=min(k, level.n),
+                                  ufactor=max(1, int(balance_tol * 1000)))
+        ids = list(ids)
+    return partition_result(names, level, ids, started, stats, backend="metis")
+
+def _fiedler_order(level):
+    # nodes sorted along the Fiedler vector of the normalised Laplacian
+    A = csr_matrix((level.weights, level.targets, level.offsets), shape=(level.n, level.n))
+    L = laplacian(A, normed=True)
+    if level.n <= DENSE_EIGEN_LIMIT:
+        _, vectors = np.linalg.eigh(L.toarray())
+        fiedler = vectors[:, 1]
+    else:
+        try:
+            values, vectors = eigsh(L, k=2, which='SA', tol=1e-6, maxiter=20 * level.n)
+        except ArpackNoConvergence as e:
+            values, vectors = e.eigenvalues, e.eigenvectors
+        if len(values) < 2:
+            return np.arange(level.n)  # no usable vector, keep the map order
+        fiedler = vectors[:, np.argsort(values)[1]]
+    return np.argsort(fiedler, kind='stable')
+
+def _spectral_bisection(level, fraction, balance_tol):
+    # cut the Fiedler order where part 0 reaches its share, then polish with FM
+    order = _fiedler_order(level)
+    filled = np.cumsum(level.vwgt[order])
+    split = int(np.searchsorted(filled, filled[-1] * fraction))
+    split = min(max(split, 1), level.n - 1)
+    part = np.ones(level.n, dtype=np.int64)
+    part[order[:split]] = 0
+    return fm_bisection_refine(level, part.tolist(), fraction, balance_tol=balance_tol)
+
+def spectral_partition(G_in, k=4, balance_tol=0.03, cost_key="weight", scale=1.0,
+                       refine=True, workers=1, stats=None):
+    # recursive spectral bisection (NumPy / SciPy only), then the same k-way refinement
+    if k < 1:
+        raise ValueError("k must be at least 1")
+
+    started = time.perf_counter()
+    names, level = similarity_level(G_in, cost_key=cost_key, scale=scale)
+    if level.n == 0:
+        return {}, {}
+
+    k = min(k, level.n)
+    assign = np.zeros(level.n, dtype=np.int64)
+    stack = [(np.arange(level.n), k, 0)]
+    while stack:
+        nodes, parts_to_make, offset = stack.pop()
+        if parts_to_make == 1:
+            assign[nodes] = offset
+            continue
+        if len(nodes) <= parts_to_make:
+            assign[nodes] = offset + np.arange(len(nodes))
+            continue
+        left_parts = parts_to_make // 2
+        part = np.array(_spectral_bisection(level.subgraph(nodes), left_parts / parts_to_make, balance_tol))
+        stack.append((nodes[part == 0], left_parts, offset))
+        stack.append((nodes[part == 1], parts_to_make - left_parts, offset + left_parts))
+
+    ids = assign.tolist()
+    moves = kway_refine(level, ids, k, balance_tol=balance_tol) if refine and k > 1 else 0
+    return partition_result(names, level, ids, started, stats, backend="spectral", kway_moves=moves)
+
+def multilevel_partition(G_in, k=4, balance_tol=0.03, cost_key="weight", scale=1.0,
+                         refine=True, workers=1, stats=None):
+    result = metis_partition(G_in, k=k, balance_tol=balance_tol, cost_key=cost_key, scale=scale,
+                             refine=refine, workers=workers, stats=stats)
+    if stats is not None:
+        stats['backend'] = "multilevel"
+    return result
+
+PARTITIONERS = {
+    "multilevel": multilevel_partition,
+    "metis": metis_binding_partition,
+    "spectral": spectral_partition,
+}
+
+# what to try, in order, for each name; "auto" prefers the METIS library when it is installed
+FALLBACKS = {
+    "auto": ["metis", "multilevel"],
+    "metis": ["metis", "multilevel"],
+}
+
+def available_partitioners():
+    names = []
+    for name, partition in PARTITIONERS.items():
+        try:
+            partition(nx.Graph(), k=1)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+# backend: a PARTITIONERS name or "auto"; stats['backend'] says which one actually ran
+def partition_graph(G_in, k=4, backend="multilevel", **options):
+    if backend not in PARTITIONERS and backend not in FALLBACKS:
+        raise ValueError(f"Unknown partitioner: {backend}")
+    errors = []
+    for name in FALLBACKS.get(backend, [backend]):
+        try:
+            return PARTITIONERS[name](G_in, k=k, **options)
+        except ImportError as e:
+            errors.append(str(e))
+    raise ImportError(f"No partitioner available for {backend}: {'; '.join(errors)}")
@@ -0,0 +1,70 @@
+import networkx as nx
+from app.services.A_star import AStarTransport
+from app.services.landmarks import LandmarkHeuristic
+from app.services.contraction_hierarchy import ContractionHierarchy
+
+def collapse_routes(R: nx.MultiGraph):
+    # the route network as one (cheapest) edge per station pair: {u: {v: weight}}
+    adj = {}
+    for u, v, data in R.edges(data=True):
+        w = data["weight"]
+        for a, b in ((u, v), (v, u)):
+            row = adj.setdefault(a, {})
+            if w < row.get(b, float('inf')):
+                row[b] = w
+    return adj
+
+# Search index over the current route network, kept between passenger queries. Every change
+# produces a new snapshot (adjacency + contraction hierarchy or landmark A*) that replaces the
+# old one in a single assignment, so a query running in another thread never sees a half
+# patched index. version goes up on every change; callers and caches key on it.
+class RouteNetworkIndex:
+    def __init__(self, R: nx.MultiGraph, contraction=False, landmarks=0):
+        self.contraction = contraction
+        self.landmark_count = landmarks
+        self.version = 0
+        self._snapshot = self._build(collapse_routes(R))
+
+    def _build(self, adj):
+        if self.contraction:
+            finder = ContractionHierarchy(adj)
+        else:
+            lm = LandmarkHeuristic(adj, k=self.landmark_count) if self.landmark_count else None
+            finder = AStarTransport(adj, landmarks=lm)
+        return adj, finder
+
+    @property
+    def adjacency(self):
+        return self._snapshot[0]
+
+    def rebuild(self, R: nx.MultiGraph):
+        self._snapshot = self._build(collapse_routes(R))
+        self.version += 1
+
+    def patch(self, removed=(), added=()):
+        # removed: station pairs that no longer have any route edge
+        # added: (u, v, weight) route edges that were added
+        # copy-on-write: only the rows of touched stations are copied
+        adj = dict(self.adjacency)
+        touched = set()
+
+        def row(n):
+            if n not in touched:
+                adj[n] = dict(adj.get(n, {}))
+                touched.add(n)
+            return adj[n]
+
+        for u, v in removed:
+            row(u).pop(v, None)
+            row(v).pop(u, None)
+        for u, v, w in added:
+            for a, b in ((u, v), (v, u)):
+                r = row(a)
+                if w < r.get(b, float('inf')):
+                    r[b] = w
+
+        self._snapshot = self._build(adj)
+        self.version += 1
+
+    def find_path(self, start_node, end_node):
+        return self._snapshot[1].find_path(start_node, end_node)
@@ -1,15 +1,19 @@
 from collections import deque
 import math
+import numpy as np
+from app.models.flow_models import cheapest_per_target, SHORT_ROW
 
 def spfa(graph, source):
     """
-    graph: adjacency list of FlowEdge
-    returns: (dist, parent)
+    graph: ResidualGraph
+    returns: (dist, parent), parent[v] = position of the arc into v (-1 if none)
     """
+    graph.compile()
     n = len(graph)
-    dist = [math.inf] * n
-    in_queue = [False] * n
-    parent = [(-1, -1)] * n  # (prev_node, edge_index)
+    offsets, to, cap, cost = graph.offsets.tolist(), graph.to, graph.cap, graph.cost
+    dist = np.full(n, math.inf)
+    in_queue = np.zeros(n, dtype=bool)
+    parent = np.full(n, -1, dtype=np.int64)
 
     dist[source] = 0
     q = deque([source])
@@ -19,12 +23,30 @@ def spfa(graph, source):
         u = q.popleft()
         in_queue[u] = False
 
-        for i, e in enumerate(graph[u]):
-            if e.capacity > 0 and dist[u] + e.cost < dist[e.to]:
-                dist[e.to] = dist[u] + e.cost
-                parent[e.to] = (u, i)
-                if not in_queue[e.to]:
-                    q.append(e.to)
-                    in_queue[e.to] = True
+        lo, hi = offsets[u], offsets[u + 1]
+        du = dist[u]
+        if hi - lo <= SHORT_ROW:
+            for p, v, c, w in zip(range(lo, hi), to[lo:hi].tolist(), cap[lo:hi].tolist(), cost[lo:hi].tolist()):
+                if c > 0 and du + w < dist[v]:
+                    dist[v] = du + w
+                    parent[v] = p
+                    if not in_queue[v]:
+                        q.append(v)
+                        in_queue[v] = True
+            continue
+
+        # relax the whole row at once
+        vs = to[lo:hi]
+        nd = du + cost[lo:hi]
+        idx = ((cap[lo:hi] > 0) & (nd < dist[vs])).nonzero()[0]
+        if not len(idx):
+            continue
+        if graph.parallel:
+            idx = cheapest_per_target(vs, nd, idx)
+        better = vs[idx]
+        dist[better] = nd[idx]
+        parent[better] = lo + idx
+        q.extend(better[~in_queue[better]].tolist())
+        in_queue[better] = True
 
     return dist, parent
@@ -3,4 +3,6 @@ from .get_html_map_raw import get_html_map_raw
 from .multigraph_to_cytoscape_json import multigraph_to_cytoscape_json
 from .route_demand import RouteDemandCalculator
 from .rand import rand_num, sample
-from .graph_distances import compute_garage_distances
\ No newline at end of file
+from .graph_distances import compute_garage_distances, garage_endpoint_distances
+from .response_cache import ResponseCache
+from .process_pool import map_tasks, resolve_workers
@@ -18,8 +18,9 @@ def create_map(nodes, density, path='', station_names_path=None,
         raise ValueError("Traffic values must be positive")
     
     station_names = None
-    with open(station_names_path, 'r') as f: 
-        station_names = loads(f.read())['stations']
+    if station_names_path:
+        with open(station_names_path, 'r') as f: 
+            station_names = loads(f.read())['stations']
     
     if station_names is None:
         station_names = [f"Station_{i}" for i in range(nodes)]
@@ -1,11 +1,93 @@
+import math
+import time
+import numpy as np
 import networkx as nx
+from scipy.sparse.csgraph import dijkstra
+from app.models import CSRGraph
+from app.utils.response_cache import ResponseCache
+from app.utils.process_pool import map_tasks
 
 def compute_garage_distances(G, garages, weight="travel_time"):
     """
+    Accepts a networkx graph or a CSRGraph.
     Returns:
     { garage_node: { target_node: distance } }
     """
+    if isinstance(G, CSRGraph):
+        idx = [G.index[g] for g in garages]
+        D = dijkstra(G.to_scipy(weight), directed=True, indices=idx).tolist() if idx else []
+        names = G.names
+        return {
+            g: {names[j]: d for j, d in enumerate(row) if d != math.inf}
+            for g, row in zip(garages, D)
+        }
+
     distances = {}
     for g in garages:
         distances[g] = nx.single_source_dijkstra_path_length(G, g, weight=weight)
     return distances
+
+
+# Garage x route endpoint distances for the fleet assignment, as a compact NumPy matrix.
+# The searches start from whichever side is smaller (garages, or endpoints on the reversed
+# graph) and keep only the columns of the other side. Results are cached per graph version,
+# garages and endpoints, so a re-solve on the same map does no searching at all.
+SEARCH_CHUNK = 64  # sources per scipy call; bounds the full distance rows held at once
+DISTANCE_CACHE = ResponseCache(maxsize=16, ttl=math.inf)
+
+def _search_chunk(search, sources):
+    A, columns = search
+    return dijkstra(A, directed=True, indices=sources)[:, columns]
+
+def _endpoint_matrix(G, garages, endpoints, weight, workers, stats):
+    started = time.perf_counter()
+    garage_idx = [G.index[g] for g in garages]
+    endpoint_idx = [G.index[e] for e in endpoints]
+    A = G.to_scipy(weight)
+    reverse = len(endpoint_idx) < len(garage_idx)
+    if reverse:
+        A = A.T.tocsr()
+        sources, columns = endpoint_idx, garage_idx
+    else:
+        sources, columns = garage_idx, endpoint_idx
+    columns = np.array(columns, dtype=np.int64)
+
+    chunks = [sources[i:i + SEARCH_CHUNK] for i in range(0, len(sources), SEARCH_CHUNK)]
+    blocks = list(map_tasks(_search_chunk, (A, columns), chunks, workers=workers))
+
+    D = np.vstack(blocks) if blocks else np.empty((0, len(columns)))
+    if reverse:
+        D = np.ascontiguousarray(D.T)
+    D = D.reshape(len(garages), len(endpoints))
+    D.flags.writeable = False  # shared through the cache
+    if stats is not None:
+        stats.update({
+            'direction': "endpoints" if reverse else "garages",
+            'searches': len(sources),
+            'time': time.perf_counter() - started,
+        })
+    return D
+
+def garage_endpoint_distances(G, garages, endpoints, weight="travel_time", workers=1, stats=None):
+    """
+    Accepts a networkx graph or a CSRGraph (weight must be one of CSRGraph.ATTRS).
+    workers: processes for the searches (None = all cores)
+    stats: optional dict, filled with direction, searches, time and cached
+    Returns: read-only float array D, D[i, j] = distance garages[i] -> endpoints[j] (inf if unreachable)
+    """
+    if not isinstance(G, CSRGraph):
+        if weight not in CSRGraph.ATTRS:
+            raise ValueError(f"Unsupported weight: {weight}")
+        G = CSRGraph.from_networkx(G)
+    garages, endpoints = tuple(garages), tuple(endpoints)
+
+    computed = False
+    def compute():
+        nonlocal computed
+        computed = True
+        return _endpoint_matrix(G, garages, endpoints, weight, workers, stats)
+
+    D = DISTANCE_CACHE.get_or_compute((G.version, weight, garages, endpoints), compute)
+    if stats is not None:
+        stats['cached'] = not computed
+    return D
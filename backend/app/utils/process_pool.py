@@ -0,0 +1,39 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# The parallel build stages (centrality shards, bisection subtrees, annealed clusters, distance
+# chunks) all run one module-level function over independent tasks that read the same large
+# object. The pool initializer sends that object to every worker once, the tasks carry only
+# their own arguments.
+
+def resolve_workers(workers):
+    # workers: a process count, or None for all cores
+    return (os.cpu_count() or 1) if workers is None else workers
+
+_worker_job = None
+
+def _init_worker(func, shared):
+    global _worker_job
+    _worker_job = (func, shared)
+
+def _run_task(task):
+    func, shared = _worker_job
+    return func(shared, task)
+
+def map_tasks(func, shared, tasks, workers=1):
+    """
+    Yields func(shared, task) for every task, in task order for any worker count.
+    func: module-level function (the workers import it by name)
+    shared: read-only object every task needs, sent to each worker process once
+    workers: > 1 spreads the tasks over a process pool (None = all cores), else they run here
+    """
+    tasks = list(tasks)
+    workers = resolve_workers(workers)
+    if workers > 1 and len(tasks) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                   initargs=(func, shared))
+        with pool:
+            yield from pool.map(_run_task, tasks)
+    else:
+        for task in tasks:
+            yield func(shared, task)
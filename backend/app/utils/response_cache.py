@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+# Bounded LRU cache with a TTL for ready-to-send responses. Concurrent misses on the same
+# key are coalesced (single flight): the first caller computes, the others wait for its
+# result. Keys should carry the network version so a changed network never hits old entries;
+# clear() additionally drops everything and stops in-flight results from being stored.
+class ResponseCache:
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}          # key -> Future
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._data[key]
+                self.expirations += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                self.misses += 1
+                owner = True
+            generation = self._generation
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._inflight.pop(key, None)
+            if generation == self._generation:
+                self._data[key] = (time.monotonic() + self.ttl, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+                    self.evictions += 1
+        future.set_result(value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
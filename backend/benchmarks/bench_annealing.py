@@ -0,0 +1,54 @@
+# simulated_annealing per cluster: exact leg-by-leg costing vs the precomputed cluster cost
+# matrix (single swaps and batches of swaps), and the stopping rules / adaptive cooling.
+# Cost is the real cost of the returned routes; iterations and acceptance are summed over clusters.
+# run from backend/:  python -m benchmarks.bench_annealing [nodes] [density]
+import random
+import sys
+import time
+from app.models import CSRGraph
+from app.services import metis_partition, simulated_annealing, LandmarkHeuristic
+from app.utils import create_map
+
+NODES = 200
+DENSITY = 0.05
+STATIONS_PER_ROUTE = 8
+MODES = [
+    ("exact", {}),
+    ("exact patience=100", {'patience': 100}),
+    ("exact adaptive", {'patience': 100, 'adaptive': True}),
+    ("exact T>=1", {'min_temperature': 1.0}),
+    ("matrix", {'leg_costs': "matrix"}),
+    ("matrix batch=8", {'leg_costs': "matrix", 'batch': 8}),
+    ("matrix batch=8 patience=100", {'leg_costs': "matrix", 'batch': 8, 'patience': 100}),
+]
+
+def bench(nodes, density, seed=0):
+    random.seed(seed)
+    G = CSRGraph.from_networkx(create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                                          min_traffic=10, max_traffic=250))
+    landmarks = LandmarkHeuristic(G, k=8, seed=seed)
+    _, clusters = metis_partition(G, k=-(-nodes // STATIONS_PER_ROUTE), balance_tol=0.05, scale=100)
+
+    rows = []
+    for label, options in MODES:
+        random.seed(seed)
+        t = time.perf_counter()
+        cost = iterations = accepted = 0
+        for cluster in clusters.values():
+            stats = {}
+            _, c, _ = simulated_annealing(G, cluster, temperature=500, max_iter=500, alpha=0.97,
+                                          heuristic_func=landmarks, stats=stats, **options)
+            cost += c
+            iterations += stats['iterations']
+            accepted += stats['accepted']
+        rows.append((label, time.perf_counter() - t, cost, iterations, accepted / max(1, iterations)))
+    return len(clusters), rows
+
+if __name__ == "__main__":
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else NODES
+    density = float(sys.argv[2]) if len(sys.argv) > 2 else DENSITY
+    n_clusters, rows = bench(nodes, density)
+    print(f"{nodes} stations, density {density}, {n_clusters} clusters, up to 500 iterations each")
+    print(f"{'mode':>28} {'time s':>8} {'total cost':>11} {'iterations':>11} {'accepted':>9}")
+    for label, elapsed, cost, iterations, rate in rows:
+        print(f"{label:>28} {elapsed:>8.2f} {cost:>11.2f} {iterations:>11} {rate:>9.0%}")
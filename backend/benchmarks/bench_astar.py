@@ -0,0 +1,69 @@
+# Micro-benchmark of AStarTransport.find_path against the original list-copying search,
+# on graphs the size create_map produces for the app (dense 100-450 stations) and sparser ones.
+# The alt columns add the landmark heuristic (LandmarkHeuristic, 8 landmarks).
+# run from backend/:  python -m benchmarks.bench_astar
+import heapq
+import random
+import time
+from app.services import AStarTransport, LandmarkHeuristic
+from app.utils import create_map
+
+CASES = [(100, 1.0), (250, 0.5), (450, 0.1), (450, 1.0)]
+QUERIES = 200
+
+def legacy_find_path(graph, start_node, end_node):
+    # the pre-parent-pointer version: copies the path into every heap entry, no closed set
+    open_set = [(0, start_node, [start_node])]
+    g_scores = {start_node: 0}
+    expanded = 0
+    while open_set:
+        f_score, current, path = heapq.heappop(open_set)
+        if current == end_node:
+            return {'path': path, 'total_time': g_scores[current]}, expanded
+        expanded += 1
+        for neighbor, cost in graph.get(current, {}).items():
+            tentative_g = g_scores[current] + cost
+            if neighbor not in g_scores or tentative_g < g_scores[neighbor]:
+                g_scores[neighbor] = tentative_g
+                heapq.heappush(open_set, (tentative_g, neighbor, path + [neighbor]))
+    return {'path': [], 'total_time': float('inf')}, expanded
+
+def bench(nodes, density, queries=QUERIES, seed=0):
+    random.seed(seed)
+    G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    astar = AStarTransport(G, count_expansions=True)
+    names = list(G.nodes())
+    pairs = [tuple(random.sample(names, 2)) for _ in range(queries)]
+
+    t = time.perf_counter()
+    legacy = [legacy_find_path(astar.graph, s, e) for s, e in pairs]
+    legacy_time = time.perf_counter() - t
+
+    t = time.perf_counter()
+    new = [astar.find_path(s, e) for s, e in pairs]
+    new_time = time.perf_counter() - t
+
+    alt = AStarTransport(astar.graph, count_expansions=True, landmarks=LandmarkHeuristic(astar.graph, k=8, seed=seed))
+    t = time.perf_counter()
+    guided = [alt.find_path(s, e) for s, e in pairs]
+    alt_time = time.perf_counter() - t
+
+    same = all(abs(a['total_time'] - b['total_time']) < 1e-9 and abs(b['total_time'] - c['total_time']) < 1e-9
+               for (a, _), b, c in zip(legacy, new, guided))
+    return {
+        'nodes': nodes, 'edges': G.number_of_edges(),
+        'legacy_ms': legacy_time * 1000 / queries, 'new_ms': new_time * 1000 / queries,
+        'legacy_exp': sum(e for _, e in legacy) / queries, 'new_exp': astar.expansions / queries,
+        'alt_ms': alt_time * 1000 / queries, 'alt_exp': alt.expansions / queries,
+        'same': same,
+    }
+
+if __name__ == "__main__":
+    print(f"{'nodes':>6} {'edges':>7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8} "
+          f"{'legacy exp':>11} {'new exp':>8} {'alt ms':>7} {'alt exp':>8} {'same':>5}")
+    for nodes, density in CASES:
+        r = bench(nodes, density)
+        print(f"{r['nodes']:>6} {r['edges']:>7} {r['legacy_ms']:>10.3f} {r['new_ms']:>8.3f} "
+              f"{r['legacy_ms']/r['new_ms']:>7.1f}x {r['legacy_exp']:>11.1f} {r['new_exp']:>8.1f} "
+              f"{r['alt_ms']:>7.3f} {r['alt_exp']:>8.1f} {str(r['same']):>5}")
@@ -0,0 +1,46 @@
+# Settled nodes and latency of unidirectional vs bidirectional AStarTransport,
+# unguided and with landmarks, on large create_map graphs (~3 edges per station).
+# run from backend/:  python -m benchmarks.bench_bidirectional
+import random
+import time
+from app.services import AStarTransport, LandmarkHeuristic
+from app.utils import create_map
+
+SIZES = [1000, 2500, 5000, 10000]
+EXTRA_DEGREE = 3
+QUERIES = 100
+
+def run(astar, pairs):
+    astar.expansions = 0
+    t = time.perf_counter()
+    costs = [astar.find_path(s, e)['total_time'] for s, e in pairs]
+    elapsed = time.perf_counter() - t
+    return costs, elapsed * 1000 / len(pairs), astar.expansions / len(pairs)
+
+def bench(nodes, queries=QUERIES, seed=0):
+    random.seed(seed)
+    density = 2 * EXTRA_DEGREE / (nodes - 1)
+    G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    names = list(G.nodes())
+    pairs = [tuple(random.sample(names, 2)) for _ in range(queries)]
+    lm = LandmarkHeuristic(G, k=8, seed=seed)
+
+    modes = {
+        'uni': AStarTransport(G, count_expansions=True),
+        'bi': AStarTransport(G, count_expansions=True, bidirectional=True),
+        'uni+alt': AStarTransport(G, count_expansions=True, landmarks=lm),
+        'bi+alt': AStarTransport(G, count_expansions=True, landmarks=lm, bidirectional=True),
+    }
+    rows = {name: run(astar, pairs) for name, astar in modes.items()}
+    reference = rows['uni'][0]
+    same = all(all(abs(a - b) < 1e-9 for a, b in zip(reference, costs)) for costs, _, _ in rows.values())
+    return G.number_of_edges(), rows, same
+
+if __name__ == "__main__":
+    print(f"{'nodes':>6} {'edges':>7} {'mode':>8} {'ms/query':>9} {'settled':>9}")
+    for n in SIZES:
+        edges, rows, same = bench(n)
+        for name, (_, ms, settled) in rows.items():
+            print(f"{n:>6} {edges:>7} {name:>8} {ms:>9.3f} {settled:>9.1f}")
+        print(f"{'':>6} {'':>7} {'same':>8} {str(same):>9}")
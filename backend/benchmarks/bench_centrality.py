@@ -0,0 +1,42 @@
+# Compares the pairwise A* centrality with the single-pass Brandes version,
+# serial and sharded over a process pool.
+# run from backend/:  python -m benchmarks.bench_centrality [workers]
+import os
+import random
+import sys
+import time
+from app.services import AStarTransport, betweenness_centrality
+from app.utils import create_map
+
+SIZES = [25, 50, 100, 200]
+DENSITY = 0.1
+
+def bench(nodes, density=DENSITY, seed=0, workers=1):
+    random.seed(seed)
+    G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    astar = AStarTransport(G)
+
+    row = {'nodes': nodes, 'edges': G.number_of_edges()}
+    scores = {}
+    for mode in ("pairwise", "brandes"):
+        t = time.perf_counter()
+        scores[mode] = betweenness_centrality(G, astar, mode=mode)
+        row[mode] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    parallel = betweenness_centrality(G, astar, workers=workers)
+    row['parallel'] = time.perf_counter() - t
+
+    row['max_diff'] = max(abs(scores['pairwise'][n] - scores['brandes'][n]) for n in G.nodes())
+    row['parallel_equal'] = parallel == scores['brandes']
+    return row
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1)
+    print(f"{'nodes':>6} {'edges':>7} {'pairwise s':>11} {'brandes s':>10} {'speedup':>8} {'max |diff|':>11} "
+          f"{f'x{workers} s':>8} {'same':>5}")
+    for n in SIZES:
+        r = bench(n, workers=workers)
+        print(f"{r['nodes']:>6} {r['edges']:>7} {r['pairwise']:>11.3f} {r['brandes']:>10.3f} "
+              f"{r['pairwise']/r['brandes']:>7.1f}x {r['max_diff']:>11.2e} {r['parallel']:>8.3f} {str(r['parallel_equal']):>5}")
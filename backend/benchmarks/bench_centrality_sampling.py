@@ -0,0 +1,44 @@
+# Build time vs hub quality for the sampled centrality mode. Hubs are picked the way
+# gen_routes does it on its first level (top score per metis cluster).
+# run from backend/:  python -m benchmarks.bench_centrality_sampling [nodes]
+import random
+import sys
+import time
+from math import ceil
+from app.services import AStarTransport, betweenness_centrality, hub_agreement, metis_partition
+from app.utils import create_map
+
+DENSITY = 0.02
+SAMPLE_FRACTIONS = [0.02, 0.05, 0.1, 0.25, 0.5]
+SEEDS = [0, 1, 2]
+# same cluster size as RouteManager's defaults (45 min routes, 1-10 min legs)
+STATIONS_PER_ROUTE = 45 / 5.5 + 1
+
+def bench(nodes, density=DENSITY):
+    random.seed(0)
+    G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    astar = AStarTransport(G)
+    _, clusters = metis_partition(G, k=ceil(nodes / STATIONS_PER_ROUTE), balance_tol=0.05, scale=100)
+
+    t = time.perf_counter()
+    exact = betweenness_centrality(G, astar)
+    exact_time = time.perf_counter() - t
+    print(f"{nodes} nodes, {G.number_of_edges()} edges, {len(clusters)} clusters, exact: {exact_time:.3f}s")
+    print(f"{'samples':>8} {'time s':>8} {'speedup':>8} {'max |err|':>10} {'hub match':>10}")
+
+    for fraction in SAMPLE_FRACTIONS:
+        k = max(1, int(nodes * fraction))
+        elapsed, err, rate = 0.0, 0.0, 0.0
+        for seed in SEEDS:
+            t = time.perf_counter()
+            approx = betweenness_centrality(G, astar, samples=k, seed=seed)
+            elapsed += time.perf_counter() - t
+            err = max(err, max(abs(exact[n] - approx[n]) for n in G.nodes()))
+            rate += hub_agreement(clusters, exact, approx)['rate']
+        elapsed /= len(SEEDS)
+        rate /= len(SEEDS)
+        print(f"{k:>8} {elapsed:>8.3f} {exact_time/elapsed:>7.1f}x {err:>10.2e} {rate:>9.1%}")
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
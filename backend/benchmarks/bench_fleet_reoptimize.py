@@ -0,0 +1,70 @@
+# Fleet assignment after road closures: warm re-solve (resolve_min_cost_flow, from the previous
+# flow and duals) vs a cold solve_min_cost_flow (dijkstra engine) on the same map. Roads are closed
+# CLOSURES_PER_STEP at a time, cumulatively; both solves get the same distance matrix, so the
+# columns compare the solver work: changed garage -> route arcs, augmentations, time, cost.
+# run from backend/:  python -m benchmarks.bench_fleet_reoptimize
+import contextlib
+import io
+import random
+import networkx as nx
+from app.models import CSRGraph, Route
+from app.services import solve_min_cost_flow, resolve_min_cost_flow
+
+# (stations, garages, routes)
+CASES = [(2000, 40, 300), (10000, 100, 1500)]
+STEPS = 5
+CLOSURES_PER_STEP = 20
+
+def street_map(n, seed=0):
+    # random tree plus about n extra streets, integer travel times like create_map
+    rng = random.Random(seed)
+    G = nx.random_labeled_tree(n, seed=seed)
+    for _ in range(n):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            G.add_edge(u, v)
+    for u, v in G.edges():
+        G[u][v].update(travel_time=rng.randint(1, 10), traffic=rng.randint(10, 250), weight=1.0)
+    return G
+
+def fleet(G, n_garages, n_routes, seed=0):
+    rng = random.Random(seed)
+    nodes = list(G.nodes())
+    routes = [Route(rng.sample(nodes, 2), number, rng.randint(1, 6)) for number in range(n_routes)]
+    total = sum(r.demand for r in routes)
+    garages = rng.sample(nodes, n_garages)
+    supply = -(-total * 6 // (5 * n_garages))  # 20% spare buses
+    return {'obj': routes, 'total_demand': total}, {g: supply for g in garages}
+
+def quiet(f, *args, **kwargs):
+    # the solvers print one line per route
+    with contextlib.redirect_stdout(io.StringIO()):
+        return f(*args, **kwargs)
+
+if __name__ == "__main__":
+    print(f"{'stations':>9} {'garages':>8} {'routes':>7} {'step':>5} {'changed':>8} "
+          f"{'warm aug':>9} {'cold aug':>9} {'warm s':>7} {'cold s':>7} {'cost equal':>11}")
+    for n, n_garages, n_routes in CASES:
+        G = street_map(n)
+        csr = CSRGraph.from_networkx(G)
+        routes_obj, garages = fleet(G, n_garages, n_routes)
+        warm, stats = {}, {}
+        quiet(solve_min_cost_flow, csr, None, routes_obj, garages, engine="dijkstra", stats=stats, warm=warm)
+        print(f"{n:>9} {n_garages:>8} {n_routes:>7} {'cold':>5} {'':>8} {'':>9} "
+              f"{stats['augmentations']:>9} {'':>7} {stats['time']:>7.2f}")
+
+        rng = random.Random(1)
+        closed = []
+        for step in range(1, STEPS + 1):
+            closed += rng.sample(list(G.edges()), CLOSURES_PER_STEP)
+            masked = csr.masked(remove_edges=closed)
+            warm_stats, cold_stats = {}, {}
+            try:
+                quiet(resolve_min_cost_flow, masked, routes_obj, warm, stats=warm_stats)
+                quiet(solve_min_cost_flow, masked, None, routes_obj, garages, engine="dijkstra", stats=cold_stats)
+            except Exception as e:
+                print(f"{'':>26} {step:>5} {e}")  # the closures cut a route off from every garage
+                break
+            equal = abs(warm_stats['cost'] - cold_stats['cost']) < 1e-6
+            print(f"{'':>26} {step:>5} {warm_stats['changed']:>8} {warm_stats['augmentations']:>9} "
+                  f"{cold_stats['augmentations']:>9} {warm_stats['time']:>7.2f} {cold_stats['time']:>7.2f} {str(equal):>11}")
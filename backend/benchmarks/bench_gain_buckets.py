@@ -0,0 +1,52 @@
+# FM gain buckets: the old sorted-keys BucketQueue vs the array-backed GainBuckets.
+# 1. raw operations: insert every node, then FM-like rounds of pop_max + re-bucketing neighbours
+# 2. one fm_bisection_refine on a 10k-node map bisection (random balanced start, 2 passes)
+# run from backend/:  python -m benchmarks.bench_gain_buckets [nodes]
+import random
+import sys
+import time
+from app.models import BucketQueue, GainBuckets
+from app.services.mini_metis import similarity_level, fm_bisection_refine, cut_size
+from app.utils import create_map
+
+NODES = 10000
+DENSITY = 0.0004  # ~4 neighbours per station
+QUEUES = [("BucketQueue", BucketQueue), ("GainBuckets", GainBuckets)]
+
+def bench_ops(cls, n, rounds, seed=0):
+    rng = random.Random(seed)
+    gains = [rng.uniform(-20, 20) for _ in range(n)]
+    q = cls()
+    t = time.perf_counter()
+    for node, g in enumerate(gains):
+        q.insert(g, node)
+    for _ in range(rounds):
+        _, node = q.pop_max()
+        for nbr in rng.sample(range(n), 4):
+            q.remove(gains[nbr], nbr)
+            gains[nbr] = rng.uniform(-20, 20)
+            q.insert(gains[nbr], nbr)
+    return time.perf_counter() - t
+
+def bench_fm(cls, level, start):
+    # GainBuckets goes through the default factory, sized to the graph
+    t = time.perf_counter()
+    part = fm_bisection_refine(level, start, max_passes=2, balance_tol=0.05,
+                               buckets=None if cls is GainBuckets else cls)
+    return time.perf_counter() - t, cut_size(level, part)
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else NODES
+    print(f"raw operations, {n} nodes, {n // 10} pop/update rounds")
+    for name, cls in QUEUES:
+        print(f"  {name:>12} {bench_ops(cls, n, n // 10):8.3f}s")
+
+    random.seed(0)
+    G = create_map(n, DENSITY, min_travel_time=1, max_travel_time=10, min_traffic=10, max_traffic=250)
+    _, level = similarity_level(G, scale=100)
+    start = [0] * (n // 2) + [1] * (n - n // 2)
+    random.shuffle(start)
+    print(f"fm_bisection_refine, {n} nodes, {G.number_of_edges()} edges, start cut {cut_size(level, start):.1f}")
+    for name, cls in QUEUES:
+        elapsed, cut = bench_fm(cls, level, start)
+        print(f"  {name:>12} {elapsed:8.3f}s  cut {cut:.1f}")
@@ -0,0 +1,50 @@
+# Garage distances for the fleet assignment: compute_garage_distances (full rows as dicts,
+# what solve_min_cost_flow used) vs garage_endpoint_distances (garage x endpoint matrix,
+# searched from the smaller side), cold, with a process pool, and from the cache.
+# run from backend/:  python -m benchmarks.bench_garage_distances
+import os
+import random
+import time
+import numpy as np
+from app.utils import compute_garage_distances, garage_endpoint_distances
+from app.utils.graph_distances import DISTANCE_CACHE
+from benchmarks.bench_metis import sparse_map
+
+# (stations, garages, routes)
+CASES = [(10000, 400, 2000), (10000, 2000, 100), (100000, 400, 1000)]
+
+def endpoints_of(G, n_routes, seed=0):
+    rng = random.Random(seed)
+    return list(dict.fromkeys(rng.choice(G.names) for _ in range(2 * n_routes)))
+
+def old(G, garages, endpoints):
+    distances = compute_garage_distances(G, garages, weight="weight")
+    return np.array([[distances[g].get(e, np.inf) for e in endpoints] for g in garages])
+
+def new(G, garages, endpoints, workers=1, clear=True):
+    if clear:
+        DISTANCE_CACHE.clear()
+    stats = {}
+    garage_endpoint_distances(G, garages, endpoints, weight="weight", workers=workers, stats=stats)
+    return stats
+
+def timed(f, *args, **kwargs):
+    started = time.perf_counter()
+    result = f(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+if __name__ == "__main__":
+    print(f"{'stations':>9} {'garages':>8} {'endpts':>7} {'method':>26} {'time s':>8}")
+    for n, n_garages, n_routes in CASES:
+        G = sparse_map(n)
+        garages = random.Random(1).sample(G.names, n_garages)
+        endpoints = endpoints_of(G, n_routes)
+        head = f"{n:>9} {n_garages:>8} {len(endpoints):>7}"
+        runs = [("compute_garage_distances", lambda: old(G, garages, endpoints))]
+        runs.append(("matrix", lambda: new(G, garages, endpoints)))
+        runs.append((f"matrix, {os.cpu_count()} workers", lambda: new(G, garages, endpoints, workers=None)))
+        runs.append(("matrix, cached", lambda: new(G, garages, endpoints, clear=False)))
+        for label, run in runs:
+            elapsed, result = timed(run)
+            direction = f" ({result['direction']})" if isinstance(result, dict) and 'direction' in result else ""
+            print(f"{head} {label + direction:>26} {elapsed:>8.2f}")
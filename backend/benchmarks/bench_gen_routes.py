@@ -0,0 +1,36 @@
+# gen_routes with the clusters annealed serially vs over a process pool: per-level wall clock
+# and a check that every worker count lays exactly the same routes.
+# run from backend/:  python -m benchmarks.bench_gen_routes [workers...]
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+from app.route_manager import RouteManager
+from app.utils import create_map
+
+NODES = 150
+DENSITY = 0.1
+
+def build(workers, seed=0):
+    random.seed(seed)
+    G = create_map(NODES, DENSITY, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    with contextlib.redirect_stdout(io.StringIO()):
+        rm = RouteManager(G, workers=workers)
+    routes = sorted((u, v, n) if u < v else (v, u, n) for u, v, n in rm.Routes[0].edges(data='number'))
+    return rm.level_times, routes
+
+if __name__ == "__main__":
+    counts = [int(a) for a in sys.argv[1:]] or [1, os.cpu_count() or 1]
+    print(f"{NODES} stations, density {DENSITY}, {os.cpu_count()} cores")
+    print(f"{'workers':>8} {'total s':>8}  per level")
+    reference = None
+    for w in counts:
+        t = time.perf_counter()
+        level_times, routes = build(w)
+        total = time.perf_counter() - t
+        reference = reference or routes
+        same = "same routes" if routes == reference else "ROUTES DIFFER"
+        print(f"{w:>8} {total:>8.2f}  {' '.join(f'{x:.2f}' for x in level_times)}  {same}")
@@ -0,0 +1,33 @@
+# Complete vs k-nearest hub graph: RouteManager build time and the cost of the routes it lays
+# on the map (sum of the weights of every route edge).
+# run from backend/:  python -m benchmarks.bench_hub_graph [sizes...]
+import contextlib
+import io
+import random
+import sys
+import time
+from app.route_manager import RouteManager
+from app.utils import create_map
+
+SIZES = [100, 200]
+DENSITY = 0.05
+HUB_NEIGHBORS = [None, 3, 5]
+
+def build(nodes, hub_neighbors, seed=0):
+    random.seed(seed)
+    G = create_map(nodes, DENSITY, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rm = RouteManager(G, hub_neighbors=hub_neighbors)
+    elapsed = time.perf_counter() - t
+    cost = sum(w for _, _, w in rm.Routes[0].edges(data='weight'))
+    return elapsed, cost, len(rm.Routes_obj['obj'])
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'nodes':>6} {'hub graph':>10} {'build s':>8} {'routes':>7} {'route cost':>11}")
+    for n in sizes:
+        for k in HUB_NEIGHBORS:
+            elapsed, cost, routes = build(n, k)
+            print(f"{n:>6} {'complete' if k is None else f'k={k}':>10} {elapsed:>8.2f} {routes:>7} {cost:>11.2f}")
@@ -0,0 +1,69 @@
+# metis_partition modes: recursive bisection only, with the k-way refinement, and with the
+# bisection subtrees on a process pool. Reports wall clock, edge cut (in the similarity
+# weights the partitioner minimises) and balance (largest part / ideal size).
+# 1. sparse maps from 1k to 100k stations
+# 2. every level gen_routes clusters (the map, then the hub graphs) on create_map graphs
+# run from backend/:  python -m benchmarks.bench_metis [sizes...]
+import contextlib
+import io
+import os
+import random
+import sys
+import networkx as nx
+from app.models import CSRGraph
+from app.route_manager import RouteManager
+from app.services.mini_metis import metis_partition
+from app.utils import create_map
+
+SIZES = [1000, 10000]
+STATIONS_PER_PART = 8
+ROUTE_MAPS = [(150, 0.1), (300, 0.05)]
+MODES = [
+    ("recursive", {'refine': False}),
+    ("k-way", {}),
+    (f"k-way, {os.cpu_count()} workers", {'workers': None}),
+]
+
+def sparse_map(n, seed=0):
+    # random tree plus about n extra edges, ~4 neighbours per station like a street map
+    rng = random.Random(seed)
+    G = nx.random_labeled_tree(n, seed=seed)
+    for _ in range(n):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            G.add_edge(u, v)
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.uniform(0.1, 3.0)
+    return CSRGraph.from_networkx(G)
+
+def bench(G, k, seed=0, **options):
+    random.seed(seed)
+    stats = {}
+    metis_partition(G, k=k, balance_tol=0.05, scale=100, stats=stats, **options)
+    return stats
+
+def route_levels(nodes, density, options, seed=0):
+    random.seed(seed)
+    G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                   min_traffic=10, max_traffic=250)
+    with contextlib.redirect_stdout(io.StringIO()):
+        rm = RouteManager(G, leg_costs="matrix", partition=options)
+    return rm.partition_stats
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'nodes':>7} {'parts':>6} {'mode':>20} {'time s':>8} {'cut':>12} {'balance':>8}")
+    for n in sizes:
+        G = sparse_map(n)
+        k = -(-n // STATIONS_PER_PART)
+        for label, options in MODES:
+            st = bench(G, k, **options)
+            print(f"{n:>7} {k:>6} {label:>20} {st['time']:>8.2f} {st['cut']:>12.0f} {st['balance']:>8.2f}")
+
+    print("\ngen_routes levels (map, then hub graphs)")
+    print(f"{'map':>10} {'level':>6} {'mode':>20} {'time s':>8} {'cut':>12} {'balance':>8}")
+    for nodes, density in ROUTE_MAPS:
+        for label, options in MODES[:2]:
+            for level, st in enumerate(route_levels(nodes, density, options), 1):
+                print(f"{f'{nodes}/{density}':>10} {level:>6} {label:>20} {st['time']:>8.2f} "
+                      f"{st['cut']:>12.1f} {st['balance']:>8.2f}")
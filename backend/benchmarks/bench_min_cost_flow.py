@@ -0,0 +1,65 @@
+# Fleet assignment min cost flow engines (SPFA successive shortest paths, primal-dual Dijkstra
+# with potentials, capacity scaling) on synthetic garage -> route networks shaped like
+# solve_min_cost_flow builds them (every garage linked to every route, costs = garage-to-endpoint
+# travel times).
+# 1. growing networks, 1-4 buses per route
+# 2. a fixed network with growing bus counts per route and tight garage supply
+# run from backend/:  python -m benchmarks.bench_min_cost_flow [garages routes ...]
+import math
+import random
+import sys
+from app.models import ResidualGraph
+from app.services.min_cost_flow_solver import add_edge, min_cost_flow
+
+INSTANCES = [(20, 200), (50, 1000), (100, 2000)]
+ENGINES = ["spfa", "dijkstra", "scaling"]
+FLEET_NETWORK = (30, 300)
+FLEET_BUSES = [4, 100, 10000]
+SPFA_MAX_ARCS = 50_000  # spfa gets too slow to wait for above this
+
+def build(n_garages, n_routes, buses=4, slack=1.2, seed=0):
+    rng = random.Random(seed)
+    demand = [rng.randint(1, buses) for _ in range(n_routes)]
+    total = sum(demand)
+    supply = [max(1, round(total * slack * w)) for w in (lambda ws: [x / sum(ws) for x in ws])(
+        [rng.random() for _ in range(n_garages)])]
+
+    SRC, garage_offset, route_offset = 0, 1, 1 + n_garages
+    SINK = route_offset + n_routes
+    graph = ResidualGraph(SINK + 1)
+    for g in range(n_garages):
+        add_edge(graph, SRC, garage_offset + g, supply[g], 0)
+    for r in range(n_routes):
+        add_edge(graph, route_offset + r, SINK, demand[r], 0)
+    for g in range(n_garages):
+        for r in range(n_routes):
+            add_edge(graph, garage_offset + g, route_offset + r, math.inf, rng.randint(1, 60))
+    return graph, SRC, SINK, total
+
+def run(n_garages, n_routes, engine, buses=4, slack=1.2):
+    graph, SRC, SINK, demand = build(n_garages, n_routes, buses, slack)
+    stats = {}
+    min_cost_flow(graph, SRC, SINK, demand, engine=engine, stats=stats)
+    return stats
+
+def row(first, second, engine, st):
+    return (f"{first:>8} {second:>7} {st['flow']:>8} {engine:>9} {st['augmentations']:>9} "
+            f"{st['time']:>8.2f} {st['cost']:>12.0f}")
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    instances = list(zip(args[::2], args[1::2])) or INSTANCES
+    print(f"{'garages':>8} {'routes':>7} {'buses':>8} {'engine':>9} {'augment.':>9} {'time s':>8} {'cost':>12}")
+    for n_garages, n_routes in instances:
+        for engine in ENGINES:
+            if engine == "spfa" and n_garages * n_routes > SPFA_MAX_ARCS:
+                print(f"{n_garages:>8} {n_routes:>7} {'':>8} {engine:>9}  skipped (too slow)")
+                continue
+            print(row(n_garages, n_routes, engine, run(n_garages, n_routes, engine)))
+
+    n_garages, n_routes = FLEET_NETWORK
+    print(f"\n{n_garages} garages, {n_routes} routes, supply 2% above demand")
+    print(f"{'max/rt':>8} {'':>7} {'buses':>8} {'engine':>9} {'augment.':>9} {'time s':>8} {'cost':>12}")
+    for buses in FLEET_BUSES:
+        for engine in ENGINES:
+            print(row(buses, "", engine, run(n_garages, n_routes, engine, buses, slack=1.02)))
@@ -0,0 +1,40 @@
+# Partitioner backends on create_map graphs: wall clock, edge cut (similarity weights),
+# balance (largest part / ideal size) and how many clusters are connected on the map.
+# Backends that aren't installed are reported and skipped (partition_graph would fall back).
+# run from backend/:  python -m benchmarks.bench_partitioners [nodes density ...]
+import random
+import sys
+import networkx as nx
+from app.models import CSRGraph
+from app.services import PARTITIONERS, available_partitioners, partition_graph
+from app.utils import create_map
+
+MAPS = [(150, 0.1), (450, 0.05), (1000, 0.01)]
+STATIONS_PER_PART = 8
+
+def bench(G, csr, k, backend, seed=0):
+    random.seed(seed)
+    stats = {}
+    _, clusters = partition_graph(csr, k=k, backend=backend, balance_tol=0.05, scale=100, stats=stats)
+    connected = sum(nx.is_connected(G.subgraph(nodes)) for nodes in clusters.values())
+    return stats, connected, len(clusters)
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    maps = [(int(args[i]), float(args[i + 1])) for i in range(0, len(args) - 1, 2)] or MAPS
+    available = available_partitioners()
+    missing = [name for name in PARTITIONERS if name not in available]
+    if missing:
+        print(f"not installed: {', '.join(missing)}")
+
+    print(f"{'map':>11} {'parts':>6} {'backend':>11} {'time s':>8} {'cut':>12} {'balance':>8} {'connected':>10}")
+    for nodes, density in maps:
+        random.seed(0)
+        G = create_map(nodes, density, min_travel_time=1, max_travel_time=10,
+                       min_traffic=10, max_traffic=250)
+        csr = CSRGraph.from_networkx(G)
+        k = -(-nodes // STATIONS_PER_PART)
+        for backend in available:
+            st, connected, parts = bench(G, csr, k, backend)
+            print(f"{f'{nodes}/{density}':>11} {parts:>6} {backend:>11} {st['time']:>8.2f} {st['cut']:>12.0f} "
+                  f"{st['balance']:>8.2f} {f'{connected}/{parts}':>10}")
@@ -0,0 +1,99 @@
+# Residual network layout for the fleet assignment: the previous list of FlowEdge objects per
+# node vs the struct-of-arrays ResidualGraph, on complete garage x route networks.
+# Reports memory held by the built network (tracemalloc), build time and the solver time of
+# the initial potentials (one SPFA) and of the first PARTIAL_DEMAND buses (Dijkstra engine);
+# --solve also runs the whole assignment with the scaling engine.
+# The object layout of 1k x 10k needs more memory than most machines have, so it is measured
+# on 100 x 10k and scaled per arc.
+# run from backend/:  python -m benchmarks.bench_residual_graph [garages routes] [--solve]
+import gc
+import math
+import random
+import sys
+import time
+import tracemalloc
+from app.models import FlowEdge, ResidualGraph
+from app.services.min_cost_flow_solver import min_cost_flow, _initial_potentials
+
+NETWORK = (1000, 10000)
+OBJECT_GARAGES = 100
+PARTIAL_DEMAND = 500
+
+def network(n_garages, n_routes, seed=0):
+    # (total demand, arc iterator) of a complete garage x route network
+    rng = random.Random(seed)
+    demand = [rng.randint(1, 4) for _ in range(n_routes)]
+    total = sum(demand)
+    supply = -(-total * 6 // (5 * n_garages))  # 20% spare buses, spread evenly
+
+    def arcs():
+        route_offset = 1 + n_garages
+        SINK = route_offset + n_routes
+        for g in range(n_garages):
+            yield 0, 1 + g, supply, 0
+        for r in range(n_routes):
+            yield route_offset + r, SINK, demand[r], 0
+        for g in range(n_garages):
+            for r in range(n_routes):
+                yield 1 + g, route_offset + r, math.inf, rng.randint(1, 60)
+    return total, arcs()
+
+def build_objects(n, arc_iter):
+    graph = [[] for _ in range(n)]
+    for u, v, capacity, cost in arc_iter:
+        graph[u].append(FlowEdge(v, capacity, cost, len(graph[v])))
+        graph[v].append(FlowEdge(u, 0, -cost, len(graph[u]) - 1))
+    return graph
+
+def build_arrays(n, arc_iter):
+    graph = ResidualGraph(n)
+    for u, v, capacity, cost in arc_iter:
+        graph.add_edge(u, v, capacity, cost)
+    return graph.compile()
+
+def measure(build, n_garages, n_routes):
+    n = n_garages + n_routes + 2
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    graph = build(n, network(n_garages, n_routes)[1])
+    elapsed = time.perf_counter() - started
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return graph, held, peak, elapsed
+
+def mb(x):
+    return f"{x / 2**20:>9.0f}"
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != "--solve"]
+    n_garages, n_routes = (int(args[0]), int(args[1])) if args else NETWORK
+    n_arcs = n_garages * (n_routes + 1) + n_routes
+
+    print(f"{n_garages} garages x {n_routes} routes, {n_arcs} arcs (+ reverses)")
+    print(f"{'layout':>22} {'held MB':>9} {'peak MB':>9} {'B/arc':>7} {'build s':>8}")
+    small = min(n_garages, OBJECT_GARAGES)
+    graph, held, peak, elapsed = measure(build_objects, small, n_routes)
+    del graph
+    scale = n_arcs / (small * (n_routes + 1) + n_routes)
+    label = "FlowEdge lists" + (f" (x{scale:.0f})" if scale > 1 else "")
+    print(f"{label:>22} {mb(held * scale)} {mb(peak * scale)} {held * scale / n_arcs:>7.0f} {elapsed * scale:>8.1f}")
+
+    graph, held, peak, elapsed = measure(build_arrays, n_garages, n_routes)
+    print(f"{'ResidualGraph':>22} {mb(held)} {mb(peak)} {held / n_arcs:>7.0f} {elapsed:>8.1f}")
+
+    SINK = n_garages + n_routes + 1
+    started = time.perf_counter()
+    _initial_potentials(graph, 0)
+    print(f"\ninitial potentials (SPFA)  {time.perf_counter() - started:8.2f} s")
+    stats = {}
+    min_cost_flow(graph, 0, SINK, PARTIAL_DEMAND, engine="dijkstra", stats=stats)
+    print(f"first {PARTIAL_DEMAND} buses (Dijkstra) {stats['time']:8.2f} s, "
+          f"{stats['time'] / stats['augmentations'] * 1000:.0f} ms per augmentation")
+
+    if "--solve" in sys.argv:
+        demand, arc_iter = network(n_garages, n_routes)
+        graph = build_arrays(n_garages + n_routes + 2, arc_iter)
+        stats = {}
+        min_cost_flow(graph, 0, SINK, demand, engine="scaling", stats=stats)
+        print(f"scaling solve              {stats['time']:8.2f} s, {stats['augmentations']} augmentations")
@@ -0,0 +1,64 @@
+# Query latency of the contraction hierarchy vs A* on growing route-network-like graphs:
+# every station sits on a line of ~LINE_LENGTH stations, each line meets an earlier one
+# (so everything is connected) and a few extra links cross between random lines, like the
+# union of the lines gen_routes produces.
+# run from backend/:  python -m benchmarks.bench_route_index [sizes...]
+import math
+import random
+import sys
+import time
+import networkx as nx
+from app.services import AStarTransport, ContractionHierarchy
+
+SIZES = [250, 1000, 2500, 5000, 10000]
+LINE_LENGTH = 10
+CROSSING_LINKS = 0.5   # extra links per line
+QUERIES = 300
+
+def route_network(nodes):
+    names = [f"Station_{i}" for i in range(nodes)]
+    order = names[:]
+    random.shuffle(order)
+    lines = [order[i:i + LINE_LENGTH] for i in range(0, nodes, LINE_LENGTH)]
+    links = [[random.choice(lines[i]), random.choice(random.choice(lines[:i]))] for i in range(1, len(lines))]
+    for _ in range(int(len(lines) * CROSSING_LINKS)):
+        a, b = random.sample(lines, 2)
+        links.append([random.choice(a), random.choice(b)])
+    lines += links
+
+    G = nx.Graph()
+    G.add_nodes_from(names)
+    for line in lines:
+        for u, v in zip(line, line[1:]):
+            if u != v:
+                travel_time = random.randint(1, 10)
+                G.add_edge(u, v, weight=travel_time / math.sqrt(random.randint(10, 250)))
+    return G
+
+def per_query_ms(finder, pairs):
+    t = time.perf_counter()
+    costs = [finder.find_path(s, e)['total_time'] for s, e in pairs]
+    return costs, (time.perf_counter() - t) * 1000 / len(pairs)
+
+def bench(nodes, queries=QUERIES, seed=0):
+    random.seed(seed)
+    G = route_network(nodes)
+    names = list(G.nodes())
+    pairs = [tuple(random.sample(names, 2)) for _ in range(queries)]
+
+    t = time.perf_counter()
+    ch = ContractionHierarchy(G)
+    build = time.perf_counter() - t
+
+    astar_costs, astar_ms = per_query_ms(AStarTransport(G), pairs)
+    _, bi_ms = per_query_ms(AStarTransport(G, bidirectional=True), pairs)
+    ch_costs, ch_ms = per_query_ms(ch, pairs)
+    same = all(abs(a - b) < 1e-9 for a, b in zip(astar_costs, ch_costs))
+    return G.number_of_edges(), build, len(ch.middle) // 2, astar_ms, bi_ms, ch_ms, same
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    print(f"{'nodes':>6} {'edges':>7} {'ch build s':>11} {'shortcuts':>10} {'A* ms':>7} {'bi A* ms':>9} {'CH ms':>7} {'same':>5}")
+    for n in sizes:
+        edges, build, shortcuts, astar_ms, bi_ms, ch_ms, same = bench(n)
+        print(f"{n:>6} {edges:>7} {build:>11.2f} {shortcuts:>10} {astar_ms:>7.3f} {bi_ms:>9.3f} {ch_ms:>7.3f} {str(same):>5}")
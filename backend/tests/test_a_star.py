@@ -0,0 +1,42 @@
+import math
+import random
+import networkx as nx
+import pytest
+from app.models import CSRGraph
+from app.services import AStarTransport
+
+def random_map(seed, n=40, p=0.08):
+    # may be disconnected, so some pairs have no path
+    rng = random.Random(seed)
+    G = nx.gnp_random_graph(n, p, seed=seed)
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.uniform(0.1, 5.0)
+    return G
+
+def path_cost(G, path):
+    return sum(G[a][b]['weight'] for a, b in zip(path, path[1:]))
+
+@pytest.mark.parametrize("landmarks", [None, 4])
+def test_bidirectional_matches_dijkstra(landmarks):
+    for seed in range(15):
+        G = random_map(seed)
+        csr = CSRGraph.from_networkx(G)
+        uni = AStarTransport(csr, landmarks=landmarks)
+        bi = AStarTransport(csr, landmarks=landmarks, bidirectional=True)
+        lengths = dict(nx.all_pairs_dijkstra_path_length(G))
+        rng = random.Random(seed)
+        for _ in range(40):
+            s, t = rng.randrange(len(G)), rng.randrange(len(G))
+            expected = lengths[s].get(t, math.inf)
+            for finder in (uni, bi):
+                result = finder.find_path(s, t)
+                assert result['total_time'] == pytest.approx(expected), (seed, s, t)
+                if expected == math.inf:
+                    assert result['path'] == []
+                else:
+                    assert result['path'][0] == s and result['path'][-1] == t
+                    assert path_cost(G, result['path']) == pytest.approx(expected)
+
+def test_bidirectional_same_station():
+    G = random_map(0)
+    assert AStarTransport(G, bidirectional=True).find_path(3, 3) == {'path': [3], 'total_time': 0}
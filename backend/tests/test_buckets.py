@@ -0,0 +1,69 @@
+import random
+from app.models import GainBuckets
+
+def test_pop_max_order():
+    buckets = GainBuckets.for_bound(10, 20)
+    for node, gain in {"a": 3.0, "b": -7.5, "c": 9.0, "d": 0.0, "e": -10.0}.items():
+        buckets.insert(gain, node)
+    popped = [buckets.pop_max() for _ in range(5)]
+    assert popped == [(9.0, "c"), (3.0, "a"), (0.0, "d"), (-7.5, "b"), (-10.0, "e")]
+    assert buckets.pop_max() is None and buckets.is_empty()
+
+def test_insert_again_updates_the_gain():
+    buckets = GainBuckets.for_bound(10, 20)
+    buckets.insert(1.0, "a")
+    buckets.insert(5.0, "b")
+    buckets.insert(8.0, "a")
+    assert len(buckets) == 2 and buckets.gain("a") == 8.0
+    assert buckets.pop_max() == (8.0, "a")
+    assert buckets.pop_max() == (5.0, "b")
+
+def test_remove():
+    buckets = GainBuckets.for_bound(10, 20)
+    for i, gain in enumerate([4.0, 4.0, 4.0, 2.0]):
+        buckets.insert(gain, i)
+    buckets.remove(4.0, 1)  # from the middle of a bucket list
+    buckets.remove(4.0, 2)  # its head
+    buckets.remove(0.0, 99)  # not there
+    assert 1 not in buckets and 0 in buckets and len(buckets) == 2
+    assert buckets.pop_max() == (4.0, 0)
+    assert buckets.pop_max() == (2.0, 3)
+
+def test_newest_first_within_a_bucket():
+    buckets = GainBuckets(max_gain=10, bucket_size=1)
+    buckets.insert(2.1, "old")
+    buckets.insert(2.9, "new")  # same bucket
+    assert buckets.pop_max() == (2.9, "new")
+    assert buckets.pop_max() == (2.1, "old")
+
+def test_out_of_range_gains_are_clamped():
+    buckets = GainBuckets(max_gain=4, bucket_size=1)
+    buckets.insert(100.0, "high")
+    buckets.insert(-100.0, "low")
+    buckets.insert(0.5, "mid")
+    assert [buckets.pop_max()[1] for _ in range(3)] == ["high", "mid", "low"]
+
+def test_random_operations_against_a_reference():
+    rng = random.Random(0)
+    buckets = GainBuckets.for_bound(50, 200)
+    reference = {}
+    for _ in range(5000):
+        op = rng.random()
+        if op < 0.5:
+            node, gain = rng.randrange(100), rng.uniform(-50, 50)
+            buckets.insert(gain, node)
+            reference[node] = gain
+        elif op < 0.7 and reference:
+            node = rng.choice(list(reference))
+            buckets.remove(reference.pop(node), node)
+        else:
+            result = buckets.pop_max()
+            if not reference:
+                assert result is None
+                continue
+            gain, node = result
+            assert reference.pop(node) == gain
+            # the popped node sits in the highest non-empty bucket
+            top = max(buckets._gain_to_bucket(g) for g in [gain, *reference.values()])
+            assert buckets._gain_to_bucket(gain) == top
+        assert len(buckets) == len(reference)
@@ -0,0 +1,37 @@
+import math
+import random
+import networkx as nx
+import pytest
+from app.models import CSRGraph
+from app.services import ContractionHierarchy
+
+def random_map(seed, n=60, p=0.06):
+    rng = random.Random(seed)
+    G = nx.gnp_random_graph(n, p, seed=seed)
+    for u, v in G.edges():
+        G[u][v]['weight'] = rng.choice([rng.uniform(0.1, 5.0), 1.0])  # some ties
+    return G
+
+@pytest.mark.parametrize("seed", range(12))
+def test_queries_match_dijkstra(seed):
+    G = random_map(seed)
+    ch = ContractionHierarchy(CSRGraph.from_networkx(G))
+    lengths = dict(nx.all_pairs_dijkstra_path_length(G))
+    for s in G.nodes:
+        for t in G.nodes:
+            expected = lengths[s].get(t, math.inf)
+            result = ch.find_path(s, t)
+            assert result['total_time'] == pytest.approx(expected), (s, t)
+            if expected == math.inf:
+                assert result['path'] == []
+                continue
+            # shortcuts are unpacked into map edges
+            path = result['path']
+            assert path[0] == s and path[-1] == t
+            assert sum(G[a][b]['weight'] for a, b in zip(path, path[1:])) == pytest.approx(expected)
+
+def test_networkx_input_and_unknown_stations():
+    G = random_map(0)
+    ch = ContractionHierarchy(G)
+    assert ch.find_path(0, 0) == {'path': [0], 'total_time': 0}
+    assert ch.find_path(0, "nowhere") == {'path': [], 'total_time': math.inf}
@@ -0,0 +1,67 @@
+import math
+import random
+import numpy as np
+import pytest
+from app.models import ResidualGraph
+from app.models.flow_models import INF_CAPACITY
+
+def random_graph(seed, n=12, m=40):
+    rng = random.Random(seed)
+    arcs = []
+    for _ in range(m):
+        u, v = rng.randrange(n), rng.randrange(n)
+        if u != v:
+            arcs.append((u, v, rng.choice([rng.randint(0, 9), math.inf]), rng.randint(-5, 20)))
+    graph = ResidualGraph(n)
+    for arc in arcs:
+        graph.add_edge(*arc)
+    return graph.compile(), arcs
+
+def test_compile_lays_out_rows():
+    graph, arcs = random_graph(0)
+    assert graph.offsets[0] == 0 and graph.offsets[-1] == 2 * len(arcs)
+    tails = graph.tails()
+    for u in range(len(graph)):
+        assert (tails[graph.arcs(u).start:graph.arcs(u).stop] == u).all()
+    # every arc shows up once forward, with its capacity and cost
+    forward = sorted((int(tails[p]), int(graph.to[p]), int(graph.cap[p]), float(graph.cost[p]))
+                     for p in np.flatnonzero(graph.forward))
+    expected = sorted((u, v, INF_CAPACITY if c == math.inf else c, float(w)) for u, v, c, w in arcs)
+    assert forward == expected
+
+def test_reverse_arcs_pair_up():
+    for seed in range(20):
+        graph, _ = random_graph(seed)
+        p = np.arange(len(graph.to))
+        rev = graph.rev
+        assert (rev[rev] == p).all()
+        assert (rev != p).all()
+        tails = graph.tails()
+        assert (graph.to[rev] == tails).all() and (tails[rev] == graph.to).all()
+        assert (graph.cost[rev] == -graph.cost).all()
+        assert (graph.forward[rev] != graph.forward).all()
+        assert (graph.cap[rev][graph.forward] == 0).all()  # no flow yet
+
+def test_parallel_arcs_are_flagged():
+    graph = ResidualGraph(3)
+    graph.add_edge(0, 1, 1, 1)
+    graph.add_edge(1, 2, 1, 1)
+    assert not graph.compile().parallel
+    graph = ResidualGraph(3)
+    graph.add_edge(0, 1, 1, 1)
+    graph.add_edge(1, 0, 1, 1)
+    assert graph.compile().parallel
+
+def test_add_after_compile_raises():
+    graph = ResidualGraph(2)
+    graph.add_edge(0, 1, 1, 1)
+    graph.compile()
+    with pytest.raises(RuntimeError):
+        graph.add_edge(1, 0, 1, 1)
+
+def test_capacities_are_whole_units():
+    graph = ResidualGraph(2)
+    graph.add_edge(0, 1, 3.0, 1)
+    with pytest.raises(ValueError):
+        graph.add_edge(0, 1, 2.5, 1)
+    assert graph.compile().cap.tolist() == [3, 0]
@@ -0,0 +1,131 @@
+import math
+import random
+import networkx as nx
+import numpy as np
+import pytest
+from app.models import ResidualGraph
+from app.services import min_cost_flow, reoptimize_min_cost_flow
+from app.services.min_cost_flow_solver import ENGINES, _garage_route_arcs
+
+def fleet(costs, supply, demand):
+    # source -> garages -> routes -> sink, like solve_min_cost_flow builds it (inf cost = closed arc)
+    n_garages, n_routes = costs.shape
+    graph = ResidualGraph(n_garages + n_routes + 2)
+    for g in range(n_garages):
+        graph.add_edge(0, 1 + g, int(supply[g]), 0)
+    for r in range(n_routes):
+        graph.add_edge(1 + n_garages + r, n_garages + n_routes + 1, int(demand[r]), 0)
+    for g in range(n_garages):
+        for r in range(n_routes):
+            c = costs[g, r]
+            graph.add_edge(1 + g, 1 + n_garages + r, math.inf if c < math.inf else 0, c if c < math.inf else 0)
+    return graph.compile()
+
+def solve(costs, supply, demand, engine):
+    graph = fleet(costs, supply, demand)
+    try:
+        _, cost = min_cost_flow(graph, 0, len(graph) - 1, int(demand.sum()), engine=engine)
+    except Exception:
+        return graph, None
+    return graph, cost
+
+def instance(seed):
+    # random garages and routes; some garages have no buses, some pairs can't be reached
+    rng = np.random.default_rng(seed)
+    n_garages, n_routes = rng.integers(1, 8), rng.integers(1, 15)
+    demand = rng.integers(1, 5, n_routes)
+    supply = rng.integers(0, 2 * demand.sum() // n_garages + 3, n_garages)
+    supply[rng.random(n_garages) < 0.3] = 0
+    costs = rng.integers(1, 60, (n_garages, n_routes)).astype(float)
+    costs[rng.random((n_garages, n_routes)) < 0.2] = math.inf
+    return rng, costs, supply, demand
+
+@pytest.mark.parametrize("idle", [1, 4, 7])
+def test_scaling_with_zero_supply_garages(idle):
+    # one garage with 5 buses and closer garages without buses, all feeding one route
+    costs = np.array([[10.0]] + [[1.0]] * idle)
+    supply = np.array([5] + [0] * idle)
+    demand = np.array([5])
+    for engine in ENGINES:
+        graph, cost = solve(costs, supply, demand, engine)
+        assert cost == 50
+        assert graph.flow_cost() == 50
+
+def test_engines_agree():
+    for seed in range(150):
+        _, costs, supply, demand = instance(seed)
+        results = {}
+        for engine in ENGINES:
+            graph, cost = solve(costs, supply, demand, engine)
+            results[engine] = cost
+            if cost is not None:
+                assert cost == pytest.approx(graph.flow_cost())
+        assert len(set(results.values())) == 1, (seed, results)
+
+def test_warm_start_matches_cold_solve():
+    for seed in range(100):
+        rng, costs, supply, demand = instance(seed)
+        graph, cost = solve(costs, supply, demand, "dijkstra")
+        if cost is None:
+            continue
+        arcs = _garage_route_arcs(graph, *costs.shape)
+        for _ in range(3):
+            new = costs.copy()
+            mask = rng.random(costs.shape) < 0.3
+            new[mask] = rng.integers(1, 80, mask.sum())
+            new[mask & (rng.random(costs.shape) < 0.3)] = math.inf
+            changed = np.flatnonzero(new.ravel() != costs.ravel())
+            changes = dict(zip(arcs.ravel()[changed].tolist(), new.ravel()[changed].tolist()))
+            _, cold = solve(new, supply, demand, "dijkstra")
+            try:
+                warm = reoptimize_min_cost_flow(graph, changes)
+            except Exception:
+                warm = None
+            if cold is None or warm is None:
+                assert cold is None and warm is None, seed
+                break
+            assert warm == pytest.approx(cold), seed
+            costs = new
+
+def test_path_with_spare_capacity():
+    # 0 -> 1 -> 2 with capacity 10 and demand 3: exactly 3 units, cost 6
+    for engine in ENGINES:
+        graph = ResidualGraph(3)
+        graph.add_edge(0, 1, 10, 1)
+        graph.add_edge(1, 2, 10, 1)
+        assert min_cost_flow(graph, 0, 2, 3, engine=engine) == (3, 6.0), engine
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+def test_engines_match_networkx(engine):
+    # random digraphs whose capacities are larger than the demand sent through them
+    for seed in range(60):
+        rng = random.Random(seed)
+        n = rng.randint(3, 12)
+        G = nx.gnp_random_graph(n, 0.35, seed=seed, directed=True)
+        for u, v in G.edges():
+            G[u][v].update(capacity=rng.randint(1, 20), weight=rng.randint(0, 30))
+        flow_value = nx.maximum_flow_value(G, 0, n - 1)
+        if flow_value == 0:
+            continue
+        demand = rng.randint(1, flow_value)
+
+        H = G.copy()
+        H.nodes[0]['demand'] = -demand
+        H.nodes[n - 1]['demand'] = demand
+        expected, _ = nx.network_simplex(H)
+
+        graph = ResidualGraph(n)
+        for u, v, data in G.edges(data=True):
+            graph.add_edge(u, v, data['capacity'], data['weight'])
+        flow, cost = min_cost_flow(graph, 0, n - 1, demand, engine=engine)
+        assert flow == demand, seed
+        assert cost == pytest.approx(expected), seed
+        assert graph.flow_cost() == pytest.approx(expected), seed
+
+        # sending the whole max flow agrees with max_flow_min_cost
+        graph = ResidualGraph(n)
+        for u, v, data in G.edges(data=True):
+            graph.add_edge(u, v, data['capacity'], data['weight'])
+        flow, cost = min_cost_flow(graph, 0, n - 1, flow_value, engine=engine)
+        assert flow == flow_value, seed
+        assert cost == pytest.approx(nx.cost_of_flow(G, nx.max_flow_min_cost(G, 0, n - 1))), seed
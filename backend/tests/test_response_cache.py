@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+from app.utils import response_cache
+from app.utils import ResponseCache
+
+def test_single_flight_coalesces_concurrent_misses():
+    cache = ResponseCache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    owner = threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+    owner.start()
+    started.wait(5)
+    waiters = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute)))
+               for _ in range(4)]
+    for t in waiters:
+        t.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for t in [owner, *waiters]:
+        t.join(5)
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+    assert cache.stats()['misses'] == 1 and cache.stats()['coalesced'] == 4
+
+def test_waiters_get_the_owners_exception():
+    cache = ResponseCache()
+    with pytest.raises(KeyError):
+        cache.get_or_compute("k", lambda: {}["missing"])
+    # nothing was stored, the next call computes again
+    assert cache.get_or_compute("k", lambda: 1) == 1
+
+def test_lru_eviction():
+    cache = ResponseCache(maxsize=2)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    cache.get_or_compute("a", lambda: 0)   # hit, "a" becomes the most recent
+    cache.get_or_compute("c", lambda: 3)   # evicts "b"
+    assert cache.get_or_compute("a", lambda: 0) == 1
+    assert cache.get_or_compute("b", lambda: 20) == 20
+    assert cache.stats()['evictions'] == 2 and cache.stats()['size'] == 2
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    assert cache.get_or_compute("k", lambda: 1) == 1
+    now[0] += 9
+    assert cache.get_or_compute("k", lambda: 2) == 1
+    now[0] += 2
+    assert cache.get_or_compute("k", lambda: 2) == 2
+    assert cache.stats()['expirations'] == 1
+
+def test_clear_drops_entries_and_in_flight_results():
+    cache = ResponseCache()
+    cache.get_or_compute("a", lambda: 1)
+
+    def compute():
+        cache.clear()  # the network changed while this response was being computed
+        return "stale"
+
+    assert cache.get_or_compute("b", compute) == "stale"  # the caller still gets its answer
+    assert cache.stats()['size'] == 0
+    assert cache.get_or_compute("a", lambda: 10) == 10
+    assert cache.get_or_compute("b", lambda: "fresh") == "fresh"
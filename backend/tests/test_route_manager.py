@@ -0,0 +1,73 @@
+import pickle
+import random
+from pathlib import Path
+import pytest
+from app.utils import create_map
+from app.route_manager import RouteManager
+
+CACHE_FILE = Path(__file__).parent.parent / "data" / "cache" / "rm_100nodes_1density.pkl"
+
+def dense_map(seed, stations=100):
+    # what api.py builds when there is no cache: every station linked to every other one
+    random.seed(seed)
+    return create_map(stations, 1, min_travel_time=1, max_travel_time=10, min_traffic=10, max_traffic=250)
+
+@pytest.mark.parametrize("partitioner, seed", [("multilevel", 0), ("multilevel", 2), ("spectral", 0)])
+def test_dense_map_keeps_parts_from_draining(partitioner, seed):
+    # the k-way refinement used to drain a part down to one station, which became a 1-station route
+    rm = RouteManager(dense_map(seed), partitioner=partitioner)
+    for stats in rm.partition_stats:
+        assert stats['smallest'] > 0.5
+    assert all(len(r.sequence) > 1 for r in rm.Routes_obj['obj'])
+
+def test_old_cache_closes_and_reopens_roads():
+    # the committed cache predates the CSR map and the warm fleet re-solve
+    with open(CACHE_FILE, "rb") as f:
+        rm = pickle.load(f)
+    u, v = next(iter(rm.Routes[-1].edges()))
+    assert rm.remove_road(u, v)
+    assert rm.closed_roads == [(u, v)] and rm.flow_warm
+    rm.reset_routes()
+    assert rm.closed_roads == []
+    pickle.dumps(rm)
+
+def test_detours_avoid_closed_roads():
+    random.seed(3)
+    G = create_map(150, 0.03, min_travel_time=1, max_travel_time=10, min_traffic=10, max_traffic=250)
+    rm = RouteManager(G)
+    rng = random.Random(0)
+    for _ in range(100):
+        u, v = rng.choice(list(rm.Routes[-1].edges()))
+        rm.remove_road(u, v)
+        if len(rm.closed_roads) >= 20:
+            break
+    closed = {frozenset(road) for road in rm.closed_roads}
+    assert len(closed) >= 20
+    assert not any(frozenset(e) in closed for e in rm.Routes[-1].edges())
+
+@pytest.mark.parametrize("leg_costs", ["exact", "matrix"])
+def test_sparse_map_with_dead_end_stations(leg_costs):
+    # a cluster whose dead-end station sat between the fixed first and last station had no
+    # finite route in either mode, matrix mode also missed routes the exact one finds
+    random.seed(5)
+    G = create_map(200, 0.03, min_travel_time=1, max_travel_time=10, min_traffic=10, max_traffic=250)
+    rm = RouteManager(G, leg_costs=leg_costs)
+    assert all(len(r.sequence) > 1 for r in rm.Routes_obj['obj'])
+
+def test_pickles_with_unguided_route_index():
+    # api.py pickles the RouteManager on its first build
+    rm = RouteManager(dense_map(0), contraction=False, landmarks=0)
+    rm = pickle.loads(pickle.dumps(rm))
+    start, end = rm.Routes_obj['obj'][0].sequence[0], rm.Routes_obj['obj'][-1].sequence[-1]
+    assert rm.shortest_route_path(start, end)['graph'].number_of_nodes() > 0
+
+@pytest.mark.parametrize("contraction", [False, True])
+def test_route_index_migration_keeps_the_stored_setting(contraction):
+    # caches pickled before the route index existed get one built on load
+    with open(CACHE_FILE, "rb") as f:
+        rm = pickle.load(f)
+    state = dict(rm.__dict__, contraction=contraction)
+    del state['route_index']
+    migrated = RouteManager.__new__(RouteManager)
+    migrated.__setstate__(state)
+    assert migrated.route_index.contraction is contraction